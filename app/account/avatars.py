@@ -0,0 +1,85 @@
+""" Thumbnails of uploaded profile pictures"""
+import hashlib
+import os
+import re
+import tempfile
+
+from PIL import Image, ImageOps
+
+# square thumbnail sizes in pixels, one for each size the templates show
+AVATAR_SIZES = (36, 64)
+# bytes copied from the upload at a time
+AVATAR_CHUNK_SIZE = 64 * 1024
+AVATAR_MAX_BYTES = 10 * 1024 * 1024
+# checked before an image is decoded, so a small file can't decode into a
+# huge one
+AVATAR_MAX_PIXELS = 40 * 1000 * 1000
+AVATAR_NAME_RE = re.compile(r'^[0-9a-f]{40}-\d+\.jpg$')
+
+
+def avatar_filename(digest, size):
+    return '%s-%d.jpg' % (digest, size)
+
+
+def save_avatar(stream, folder):
+    """
+    Copy an uploaded picture to disk in chunks while hashing it, then write
+    a JPEG thumbnail for each of AVATAR_SIZES named after the hash. Uploads
+    of the same picture share their thumbnails, and a thumbnail never
+    changes once written. Returns the hash, or raises ValueError if the
+    upload isn't a usable picture.
+    """
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    digest = hashlib.sha1()
+    handle, path = tempfile.mkstemp(suffix='.upload', dir=folder)
+    try:
+        with os.fdopen(handle, 'wb') as upload:
+            size = 0
+            for chunk in iter(lambda: stream.read(AVATAR_CHUNK_SIZE), b''):
+                size += len(chunk)
+                if size > AVATAR_MAX_BYTES:
+                    raise ValueError("The picture is larger than %d MB"
+                                     % (AVATAR_MAX_BYTES // 1024 // 1024))
+                digest.update(chunk)
+                upload.write(chunk)
+
+        digest = digest.hexdigest()
+        if not all(os.path.exists(os.path.join(
+                folder, avatar_filename(digest, size)))
+                for size in AVATAR_SIZES):
+            write_thumbnails(path, folder, digest)
+        return digest
+    finally:
+        os.remove(path)
+
+
+def open_image(path):
+    try:
+        image = Image.open(path)
+        if image.size[0] * image.size[1] > AVATAR_MAX_PIXELS:
+            raise ValueError("The picture has too many pixels")
+        image.load()
+    except IOError:
+        raise ValueError("The file isn't a supported picture")
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # JPEG has no transparency, put transparent pictures on white
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert('RGB')
+
+
+def write_thumbnails(path, folder, digest):
+    image = open_image(path)
+    for size in AVATAR_SIZES:
+        thumbnail = ImageOps.fit(image, (size, size), Image.ANTIALIAS)
+        # write to a temporary file first so a thumbnail is never served
+        # half written
+        handle, temp_path = tempfile.mkstemp(suffix='.jpg', dir=folder)
+        with os.fdopen(handle, 'wb') as temp:
+            thumbnail.save(temp, 'JPEG', quality=85, optimize=True)
+        os.rename(temp_path, os.path.join(folder,
+                                          avatar_filename(digest, size)))
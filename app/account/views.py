@@ -1,17 +1,22 @@
 import os
 
-from werkzeug import secure_filename
 from flask import render_template, flash, redirect, url_for, request, \
     current_app, send_from_directory
 from flask_login import current_user, login_required
 
 from app import db
-from app.models import User, Role
+from app.models import User, Role, Asset, Counter
 from app.account import account
+from app.auth import forget_identity
+from app.account.avatars import save_avatar, avatar_filename, AVATAR_NAME_RE
 from forms import EditProfileForm
 
 PROFILE_PIC_ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 PROFILE_PIC_UPLOAD_SUBFOLDER = 'avatars'
+# thumbnails are named after their content so they can be cached for good
+PROFILE_PIC_CACHE_SECONDS = 365 * 24 * 60 * 60
+# number of users per page of the user directory
+USERS_PAGE_SIZE = 20
 
 
 @account.before_request
@@ -42,19 +47,26 @@ def edit():
     if form.validate_on_submit():
         pic_file = request.files[form.profile_pic.name]
         if pic_file and allowed_file(pic_file.filename):
-            filename = secure_filename(pic_file.filename)
-            folder = os.path.join(current_app.config['UPLOAD_FOLDER'],
-                                  PROFILE_PIC_UPLOAD_SUBFOLDER)
-            if not os.path.exists(folder):
-                os.makedirs(folder)
-            pic_file.save(os.path.join(folder, filename))
-            current_user.profile_pic_url = url_for('.profile_pic',
-                                                   filename=filename)
-
+            try:
+                current_user.avatar = save_avatar(pic_file.stream,
+                                                  avatars_folder())
+            except ValueError, e:
+                flash(unicode(e), "danger")
+                return render_template('account/edit.html', form=form)
+
+        if current_user.name != form.name.data:
+            # names are shown in the asset lists, so the assets the user
+            # added or holds count as changed
+            Asset.query.filter(db.or_(
+                Asset.added_by_id == current_user.id,
+                Asset.assignee_id == current_user.id
+            )).update({'version': Counter.incr('inventory')},
+                      synchronize_session=False)
         current_user.name = form.name.data
         current_user.email = form.email.data
         db.session.add(current_user)
         db.session.commit()
+        forget_identity(current_user.id)
         flash("Account information saved successfully", "success")
         return redirect(url_for('.show'))
 
@@ -67,15 +79,56 @@ def edit():
 
 @account.route('/users/')
 def users():
-    return render_template('account/users.html', roles=Role.query.all())
+    """
+    The user directory, searchable by name and email and filterable by
+    role. Pages are fetched with one extra row to find out if there's a
+    next page without counting all the users.
+    """
+    page = max(request.args.get('page', 1, type=int), 1)
+    text = request.args.get('q', '').strip()
+    role = request.args.get('role')
+    if Role.registry().get(role) is None:
+        role = None
+    rows = User.directory(text, role, (page - 1) * USERS_PAGE_SIZE,
+                          USERS_PAGE_SIZE + 1)
+
+    return render_template(
+        'account/users.html',
+        users=rows[:USERS_PAGE_SIZE],
+        page=page,
+        has_next=len(rows) > USERS_PAGE_SIZE,
+        q=text,
+        role=role,
+        roles=Role.registry().all()
+    )
 
 
 @account.route('/profile_pic/<filename>')
 def profile_pic(filename):
-    return send_from_directory(
-        os.path.join(current_app.config['UPLOAD_FOLDER'],
-                     PROFILE_PIC_UPLOAD_SUBFOLDER),
-        filename)
+    if not AVATAR_NAME_RE.match(filename):
+        # a picture uploaded before thumbnails were made
+        return send_from_directory(avatars_folder(), filename)
+
+    response = send_from_directory(avatars_folder(), filename,
+                                   cache_timeout=PROFILE_PIC_CACHE_SECONDS)
+    response.headers['Cache-Control'] = 'private, max-age=%d, immutable' \
+        % PROFILE_PIC_CACHE_SECONDS
+    return response
+
+
+@account.app_template_global()
+def avatar_url(user, size):
+    """URL of a user's profile picture that is size pixels square"""
+    if user.avatar:
+        return url_for('account.profile_pic',
+                       filename=avatar_filename(user.avatar, size))
+    return user.profile_pic_url or url_for('static',
+                                           filename='profile_pic.png')
+
+
+def avatars_folder():
+    return os.path.join(current_app.config['UPLOAD_FOLDER'],
+                        PROFILE_PIC_UPLOAD_SUBFOLDER)
 
 
 def allowed_file(filename):
@@ -0,0 +1,254 @@
+""" Bulk import and export of assets as CSV or NDJSON files"""
+import codecs
+import csv
+import json
+from datetime import datetime
+from StringIO import StringIO
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.models import Asset, AssetEvent, Counter, User, export_value
+from app.helpers import chunks
+
+FORMATS = ('csv', 'ndjson')
+# number of rows validated, inserted and committed together
+IMPORT_CHUNK_SIZE = 500
+IMPORT_FIELDS = ('name', 'type', 'description', 'serial_no', 'code',
+                 'purchased')
+IMPORT_REQUIRED_FIELDS = ('name', 'type', 'serial_no', 'code')
+# the form's date format is tried first, then ISO dates
+IMPORT_DATE_FORMATS = ('%d/%m/%Y', '%Y-%m-%d')
+
+
+class ImportResult(object):
+    def __init__(self):
+        self.imported = 0
+        # (row number, reason) for each row that wasn't imported
+        self.rejected = []
+
+
+def import_format(filename):
+    """Guess the import format from a file name"""
+    if filename.lower().endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+
+def read_csv_rows(stream):
+    """
+    Parse the rows of a UTF-8 CSV file into dicts keyed by the header. A row
+    that can't be parsed or decoded is yielded as None, so it's reported as
+    rejected without stopping the import.
+    """
+    reader = csv.reader(stream)
+    header = None
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error:
+            if header is None:
+                # no column is known, so every row will be missing fields
+                header = []
+            else:
+                yield None
+            continue
+        if not row:
+            continue
+        if header is None:
+            header = [name.decode('utf-8', 'replace') for name in row]
+            # a byte order mark left by spreadsheet apps isn't part of the
+            # first column name
+            header[0] = header[0].lstrip(u'\ufeff')
+            continue
+        try:
+            yield dict(zip(header, [value.decode('utf-8') for value in row]))
+        except UnicodeDecodeError:
+            yield None
+
+
+def read_rows(stream, file_format):
+    """Parse the rows of an import file one at a time"""
+    if file_format == 'csv':
+        for row in read_csv_rows(stream):
+            yield row
+    else:
+        for line in stream:
+            line = line.strip()
+            if line.startswith(codecs.BOM_UTF8):
+                line = line[len(codecs.BOM_UTF8):]
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else None
+
+
+def parse_date(value):
+    if not value:
+        return None
+    for date_format in IMPORT_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    raise ValueError("Invalid purchase date '%s'" % value)
+
+
+def clean_row(row):
+    """Return the asset table values for a row or raise ValueError"""
+    if row is None:
+        raise ValueError("Not a valid record")
+    values = {}
+    for field in IMPORT_FIELDS:
+        value = row.get(field)
+        values[field] = value if value is None else unicode(value).strip()
+
+    missing = [field for field in IMPORT_REQUIRED_FIELDS if not values[field]]
+    if missing:
+        raise ValueError("Missing %s" % ', '.join(missing))
+    for field in IMPORT_FIELDS:
+        length = getattr(Asset.__table__.c[field].type, 'length', None)
+        if length and values[field] and len(values[field]) > length:
+            raise ValueError("%s is longer than %d characters"
+                             % (field, length))
+
+    values['purchased'] = parse_date(values['purchased'])
+    return values
+
+
+def added_events(rows, added_by):
+    """
+    Return the statement logging an add event for each of the rows just
+    inserted, found by their codes
+    """
+    asset = Asset.__table__
+    return AssetEvent.__table__.insert().from_select(
+        ['asset_id', 'actor_id', 'kind', 'ts'],
+        db.select([asset.c.id, db.literal(added_by.id),
+                   db.literal('add'), db.literal(datetime.now())])
+        .where(asset.c.code.in_([row['code'] for row in rows]))
+    )
+
+
+def import_assets(stream, file_format, added_by):
+    """
+    Import assets from a CSV or NDJSON stream. Rows are checked and inserted
+    in chunks along with their add events, each chunk in its own
+    transaction, so a bad row only rejects itself and a failure only loses
+    the current chunk.
+    """
+    result = ImportResult()
+    numbered = enumerate(read_rows(stream, file_format), 1)
+    for chunk in chunks(numbered, IMPORT_CHUNK_SIZE):
+        values = []
+        for number, row in chunk:
+            try:
+                values.append((number, clean_row(row)))
+            except ValueError, e:
+                result.rejected.append((number, unicode(e)))
+
+        # one query to find the codes in this chunk that are already taken
+        codes = set(value['code'] for _, value in values)
+        taken = set(code for code, in db.session.query(Asset.code)
+                    .filter(Asset.code.in_(codes))) if codes else set()
+
+        rows, numbers = [], []
+        for number, value in values:
+            if value['code'] in taken:
+                result.rejected.append(
+                    (number, "Andela Serial Code %s isn't unique"
+                     % value['code']))
+                continue
+            taken.add(value['code'])
+            value['added_by_id'] = added_by.id
+            rows.append(value)
+            numbers.append(number)
+
+        if not rows:
+            continue
+        try:
+            version = Counter.incr('inventory')
+            for row in rows:
+                row['version'] = version
+            db.session.execute(Asset.__table__.insert(), rows)
+            db.session.execute(added_events(rows, added_by))
+            Counter.count('assets', len(rows))
+            db.session.commit()
+        except SQLAlchemyError, e:
+            db.session.rollback()
+            result.rejected.extend(
+                (number, "Failed to save due to a %s error"
+                 % e.__class__.__name__)
+                for number in numbers)
+        else:
+            result.imported += len(rows)
+
+    result.rejected.sort()
+    return result
+
+
+EXPORT_COLUMNS = ('id', 'name', 'type', 'description', 'serial_no', 'code',
+                  'purchased', 'lost', 'return_date', 'assignee',
+                  'assignee_email', 'added_by')
+# number of rows fetched from the server-side cursor and written at a time
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def export_rows():
+    """
+    Yield every asset with its assignee and adder names as a tuple in
+    EXPORT_COLUMNS order. The rows come from a single joined query read
+    through a server-side cursor, so memory use doesn't grow with the
+    table.
+    """
+    asset = Asset.__table__
+    assignee = User.__table__.alias('assignee')
+    adder = User.__table__.alias('adder')
+    query = db.select([
+        asset.c.id, asset.c.name, asset.c.type, asset.c.description,
+        asset.c.serial_no, asset.c.code, asset.c.purchased, asset.c.lost,
+        asset.c.return_date, assignee.c.name, assignee.c.email, adder.c.name,
+    ]).select_from(
+        asset.outerjoin(assignee, assignee.c.id == asset.c.assignee_id)
+        .outerjoin(adder, adder.c.id == asset.c.added_by_id)
+    ).order_by(asset.c.id)
+
+    result = db.session.connection().execution_options(
+        stream_results=True).execute(query)
+    try:
+        while True:
+            rows = result.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield tuple(row)
+    finally:
+        result.close()
+
+
+def export_chunks(rows, file_format):
+    """Encode rows as CSV or NDJSON, one chunk of text per batch"""
+    if file_format == 'csv':
+        yield ','.join(EXPORT_COLUMNS) + '\r\n'
+    for batch in chunks(rows, EXPORT_BATCH_SIZE):
+        buf = StringIO()
+        if file_format == 'csv':
+            writer = csv.writer(buf)
+            for row in batch:
+                writer.writerow([
+                    '' if value is None else
+                    unicode(export_value(value)).encode('utf-8')
+                    for value in row
+                ])
+        else:
+            for row in batch:
+                buf.write(json.dumps(
+                    dict(zip(EXPORT_COLUMNS, map(export_value, row)))))
+                buf.write('\n')
+        yield buf.getvalue()
@@ -1,7 +1,8 @@
 from wtforms import validators, StringField, SubmitField, TextAreaField, \
-    DateField, RadioField
+    DateField, IntegerField, FileField
+from wtforms.widgets import HiddenInput
 from flask_wtf import Form
-from app.models import Asset
+from app.models import Asset, User
 
 
 class AssetForm(Form):
@@ -45,7 +46,29 @@ class EditAssetForm(AssetForm):
 
 
 class AssignAssetForm(Form):
-    user = RadioField("User to assign", coerce=int, validators=[validators.DataRequired()])
+    # set by the typeahead on the assign page
+    user = IntegerField("User to assign", widget=HiddenInput(), validators=[
+        validators.DataRequired("You must select a user to assign")])
     return_date = DateField("Return date",
                             format='%d/%m/%Y')
-    submit = SubmitField("Assign")
\ No newline at end of file
+    submit = SubmitField("Assign")
+
+    def validate(self, **kwargs):
+        valid = Form.validate(self)
+        self.assignee = None
+        if valid:
+            # only the submitted user is looked up
+            self.assignee = User.with_role('staff').filter(
+                User.id == self.user.data).first()
+            if self.assignee is None:
+                self.user.errors.append("Assets can only be assigned to "
+                                        "staff members")
+                valid = False
+
+        return valid
+
+
+class ImportAssetsForm(Form):
+    assets_file = FileField("CSV or NDJSON file",
+                            validators=[validators.DataRequired()])
+    submit = SubmitField("Import")
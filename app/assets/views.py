@@ -1,13 +1,31 @@
-import json
+import hashlib
+from datetime import date, datetime, timedelta
 
-from flask import render_template, flash, redirect, url_for, request
+from flask import render_template, flash, redirect, url_for, request, \
+    Response, stream_with_context, jsonify
 from flask_login import current_user, login_required
 
 from app import db
-from app.models import Asset, User
+from app.models import Asset, AssetEvent, AssignmentHistory, Counter, \
+    User, export_value
 from app.auth import role_required
 from app.assets import assets
-from forms import AddAssetForm, AssignAssetForm, EditAssetForm
+from app.helpers import json_array_stream, chunks
+from app.assets.bulk import import_assets, import_format, export_rows, \
+    export_chunks, EXPORT_MIMETYPES
+from forms import AddAssetForm, AssignAssetForm, EditAssetForm, \
+    ImportAssetsForm
+
+# number of rows fetched from the server-side cursor at a time
+ASSETS_STREAM_BATCH = 100
+# default number of search results per page
+SEARCH_PAGE_SIZE = 20
+# most assets, search results or events a client can ask for in one page
+MAX_PAGE_SIZE = 500
+# default number of events or assets per timeline and as of page
+TIMELINE_PAGE_SIZE = 50
+# number of staff members suggested by the assign page's typeahead
+ASSIGNEES_LIMIT = 10
 
 
 @assets.before_request
@@ -24,41 +42,166 @@ def index():
         return redirect(url_for('.mine'))
 
 
+def inventory_etag(version):
+    """
+    Strong ETag of an asset list. It changes with the inventory version,
+    which every asset change bumps, and depends on the user and the URL.
+    The date is part of it too because due dates are flagged as near or
+    past relative to today.
+    """
+    key = '%s:%s:%s:%s' % (version, current_user.id, request.full_path,
+                           date.today())
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def json_assets(query, scope):
+    """
+    Stream the assets matched by query as a JSON array, newest first. scope
+    is the query for every asset the client may have seen in the list, a
+    superset of query.
+
+    Pagination is keyset based: ``after`` is the id of the last asset the
+    client already has and ``limit`` is the maximum number of assets to
+    return. Both are optional, ``limit`` defaults to and can't be more than
+    MAX_PAGE_SIZE.
+
+    The inventory version the list was read at is sent in the
+    X-Inventory-Version header. Passing it back as ``since`` returns only
+    the changes made after it, see assets_delta.
+
+    Nothing is queried or serialized when the client's If-None-Match
+    matches the list's ETag, it gets a 304 instead.
+    """
+    # read the version before the assets, anything changed after this is
+    # sent again next time
+    version = Counter.get('inventory')
+    etag = inventory_etag(version)
+    since = request.args.get('since', type=int)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif since is not None:
+        response = assets_delta(query, scope, since, version)
+    else:
+        response = assets_response(query, version)
+    response.set_etag(etag)
+    # let the browser keep the list but check with us before using it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def assets_delta(query, scope, since, version):
+    """
+    The assets of a list that changed after the inventory version since,
+    and the ids of the changed assets that are no longer in the list. Only
+    assets in scope can be removed, so a client isn't told the ids of
+    assets it could never have seen. Both are found through the index on
+    Asset.version, so the cost follows the number of changes rather than
+    the size of the list.
+    """
+    changed = query.filter(Asset.version > since) \
+        .order_by(Asset.id.desc()).all()
+    listed = set(asset.id for asset in changed)
+    removed = [asset_id for asset_id, in
+               scope.filter(Asset.version > since).with_entities(Asset.id)
+               if asset_id not in listed]
+    return jsonify(version=version, changed=Asset.serialize_all(changed),
+                   removed=removed)
+
+
+def page_size(default):
+    """The limit asked for, kept between 1 and MAX_PAGE_SIZE"""
+    limit = request.args.get('limit', default, type=int)
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+
+def assets_response(query, version):
+    query = query.order_by(Asset.id.desc())
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(Asset.id < after)
+    query = query.limit(page_size(MAX_PAGE_SIZE))
+
+    rows = (row
+            for batch in chunks(query.yield_per(ASSETS_STREAM_BATCH),
+                                ASSETS_STREAM_BATCH)
+            for row in Asset.serialize_all(batch))
+    response = Response(stream_with_context(json_array_stream(rows)),
+                        mimetype='application/json')
+    response.headers['X-Inventory-Version'] = str(version)
+    return response
+
+
 @assets.route('/assigned_to_me')
 def mine():
-    _assets = current_user.assets_assigned
-    heading = 'Assets assigned to you'
-
     if request.args.get('accept') == 'json':
-        return json.dumps([i.serialize for i in _assets])
+        # the list can only ever have held assets assigned to the user
+        held = db.session.query(AssignmentHistory.asset_id) \
+            .filter(AssignmentHistory.user_id == current_user.id)
+        return json_assets(
+            Asset.query.with_parent(current_user, 'assets_assigned'),
+            Asset.query.filter(Asset.id.in_(held)))
 
-    return render_template('assets/index.html', assets=_assets,
-                           heading=heading)
+    return render_template('assets/index.html',
+                           heading='Assets assigned to you',
+                           search_url=url_for('.search', mine=1))
 
 
 @assets.route('/admin/')
 @assets.route('/admin/<filter_by>')
 @role_required('admin')
 def admin(filter_by=None):
-    query = Asset.query.order_by(Asset.id.desc())
+    query, heading = filtered_assets(filter_by)
+    if request.args.get('accept') == 'json':
+        return json_assets(query, Asset.query)
+
+    return render_template('assets/index.html', heading=heading,
+                           search_url=url_for('.search', filter_by=filter_by))
+
+
+def filtered_assets(filter_by):
+    """Return the assets query and page heading for an admin list filter"""
+    query = Asset.query
     if filter_by == 'assigned':
-        _assets = [asset for asset in query.all() if asset.is_assigned]
+        query = query.filter(Asset.assignee_id.isnot(None))
         heading = 'Assigned assets'
     elif filter_by == 'available':
-        _assets = [asset for asset in query.all() if not asset.is_assigned and not asset.lost]
+        query = query.filter(Asset.assignee_id.is_(None),
+                             Asset.lost.isnot(True))
         heading = 'Available assets'
     elif filter_by == 'lost':
-        _assets = [asset for asset in query.all() if asset.lost]
+        # plain "WHERE lost" so the partial ix_asset_lost index matches, the
+        # planner can't tell "lost IS true" implies its predicate
+        query = query.filter(Asset.lost)
         heading = 'Lost assets'
     else:
-        _assets = query.all()
         heading = 'Assets'
-
-    if request.args.get('accept') == 'json':
-        return json.dumps([i.serialize for i in _assets])
-
-    return render_template('assets/index.html', assets=_assets,
-                           heading=heading)
+    return query, heading
+
+
+@assets.route('/search')
+def search():
+    """
+    Search the assets of the list a page shows: the user's own assets with
+    mine=1, which is all staff members can search, or the admin list picked
+    by the same filter_by values. Results are paginated with page and limit.
+    """
+    if current_user.has_admin and not request.args.get('mine'):
+        query, _ = filtered_assets(request.args.get('filter_by'))
+    else:
+        query = Asset.query.with_parent(current_user, 'assets_assigned')
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = page_size(SEARCH_PAGE_SIZE)
+    # fetch one extra row to find out if there's a next page without
+    # counting all the matches
+    results = Asset.search(request.args.get('q', ''), query) \
+        .offset((page - 1) * limit).limit(limit + 1).all()
+
+    return jsonify(
+        results=Asset.serialize_all(results[:limit]),
+        page=page,
+        has_next=len(results) > limit
+    )
 
 
 @assets.route('/add', methods=['GET', 'POST'])
@@ -75,7 +218,7 @@ def add():
             form.purchased.data,
             current_user
         )
-        db.session.add(asset)
+        db.session.add_all([asset, AssetEvent('add', asset, current_user)])
         db.session.commit()
         flash("Asset added", "success")
         return redirect(url_for('assets.index'))
@@ -83,6 +226,39 @@ def add():
     return render_template('assets/add.html', form=form, heading='Add asset')
 
 
+@assets.route('/import', methods=['GET', 'POST'])
+@role_required('admin')
+def bulk_import():
+    form = ImportAssetsForm()
+    result = None
+    if form.validate_on_submit():
+        upload = request.files[form.assets_file.name]
+        result = import_assets(upload.stream, import_format(upload.filename),
+                               current_user)
+        flash("%d assets imported, %d rejected"
+              % (result.imported, len(result.rejected)),
+              "success" if not result.rejected else "warning")
+
+    return render_template('assets/import.html', form=form, result=result,
+                           heading='Import assets')
+
+
+@assets.route('/export')
+@role_required('admin')
+def export():
+    file_format = request.args.get('format')
+    if file_format not in EXPORT_MIMETYPES:
+        file_format = 'csv'
+
+    response = Response(
+        stream_with_context(export_chunks(export_rows(), file_format)),
+        mimetype=EXPORT_MIMETYPES[file_format]
+    )
+    response.headers['Content-Disposition'] = \
+        'attachment; filename=assets.%s' % file_format
+    return response
+
+
 @assets.route('/<asset_id>/edit', methods=['GET', 'POST'])
 @role_required('admin')
 def edit(asset_id):
@@ -96,6 +272,10 @@ def edit(asset_id):
         asset.serial_no = form.serial_no.data
         asset.code = form.code.data
         asset.purchased = form.purchased.data
+        event = AssetEvent.edited(asset, current_user)
+        if event is not None:
+            db.session.add(event)
+            asset.touch()
         db.session.add(asset)
         db.session.commit()
         flash("Asset saved", "success")
@@ -129,31 +309,48 @@ def assign(asset_id):
                                be assigned")
 
     form = AssignAssetForm()
-    form.user.choices = [(user.id, "%s &lt;%s&gt;" % (user.name, user.email))
-                         for user in User.query.all()
-                         if user.is_staff]
-
     if form.validate_on_submit():
-        user = User.query.filter_by(id=form.user.data).first()
-        if user is not None:
-            asset.assign(user, form.return_date.data)
-            db.session.add_all([asset, user])
-            db.session.commit()
-            flash("Asset assigned to %s" % user.name, "success")
-            return redirect(url_for('assets.index'))
-
-        flash("You must select a user to assign", "danger")
+        user = form.assignee
+        asset.assign(user, form.return_date.data)
+        db.session.add_all([asset, user, AssetEvent(
+            'assign', asset, current_user, user,
+            {'return_date': export_value(form.return_date.data)}
+        )])
+        db.session.commit()
+        flash("Asset assigned to %s" % user.name, "success")
+        return redirect(url_for('assets.index'))
 
     return render_template('assets/assign.html', form=form,
                            heading='Assign asset', asset=asset)
 
 
+@assets.route('/assignees')
+@role_required('admin')
+def assignees():
+    """
+    Staff members whose name or email has words starting with the words of
+    q, for the typeahead of the assign page
+    """
+    query = User.search(request.args.get('q', ''),
+                        db.session.query(User.id, User.name, User.email))
+    users = User.with_role('staff', query) \
+        .order_by(User.name, User.id).limit(ASSIGNEES_LIMIT)
+    return jsonify(results=[
+        {'id': user_id, 'name': name, 'email': email}
+        for user_id, name, email in users
+    ])
+
+
 @assets.route('/<asset_id>/reclaim', methods=['POST'])
 @role_required('admin')
 def reclaim(asset_id):
     asset = Asset.query.filter_by(id=asset_id).first_or_404()
+    if not asset.is_assigned:
+        return render_template('error/generic.html',
+                               message="This asset isn't assigned to anyone")
     # copy the name 'cause assignee will be removed
     name = asset.assignee.name[:]
+    db.session.add(AssetEvent('reclaim', asset, current_user, asset.assignee))
     asset.reclaim()
     db.session.add(asset)
     db.session.commit()
@@ -171,7 +368,8 @@ def report_lost(asset_id):
             message="You can only report assets assigned to you"
         )
     asset.set_lost(True)
-    db.session.add(asset)
+    db.session.add_all([asset, AssetEvent('lost', asset, current_user,
+                                          asset.assignee)])
     db.session.commit()
     flash("Reported", "success")
     return redirect(url_for('assets.index'))
@@ -188,7 +386,8 @@ def report_found(asset_id):
                 message="This asset is not lost"
             )
         asset.set_lost(False)
-        db.session.add(asset)
+        db.session.add_all([asset, AssetEvent('found', asset, current_user,
+                                              asset.assignee)])
         db.session.commit()
         flash("Reported as found", "success")
         return redirect(url_for('assets.index'))
@@ -197,3 +396,81 @@ def report_found(asset_id):
         'error/generic.html',
         message="Only admins or the assigned user can mark assets found"
     )
+
+
+def timeline_page(query):
+    """
+    Return a page of events as JSON, newest first. ``before`` is the id of
+    the last event the client already has.
+    """
+    limit = page_size(TIMELINE_PAGE_SIZE)
+    events = AssetEvent.timeline(query, request.args.get('before', type=int),
+                                 limit + 1).all()
+    return jsonify(results=[event.serialize for event in events[:limit]],
+                   has_next=len(events) > limit)
+
+
+@assets.route('/<asset_id>/timeline')
+@role_required('admin')
+def timeline(asset_id):
+    asset = Asset.query.filter_by(id=asset_id).first_or_404()
+    return timeline_page(AssetEvent.query.filter_by(asset_id=asset.id))
+
+
+@assets.route('/users/<int:user_id>/timeline')
+def user_timeline(user_id):
+    if not current_user.has_admin and current_user.id != user_id:
+        return render_template(
+            'error/generic.html',
+            message="You can only see your own asset history"
+        ), 403
+    return timeline_page(AssetEvent.query.filter_by(user_id=user_id))
+
+
+def parse_as_of(value):
+    """
+    Parse an as of date or date and time. A date on its own means the end
+    of that day.
+    """
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') + timedelta(days=1)
+    except (TypeError, ValueError):
+        return None
+
+
+@assets.route('/admin/as_of')
+@role_required('admin')
+def as_of():
+    """
+    The assets that were assigned at a point in time and who held them,
+    optionally for one user only. Pagination is keyset based on the asset
+    id, like the asset lists.
+    """
+    when = parse_as_of(request.args.get('date'))
+    if when is None:
+        return jsonify(error="date must be YYYY-MM-DD or "
+                             "YYYY-MM-DDTHH:MM:SS"), 400
+
+    query = AssetEvent.holders_as_of(when, request.args.get('user_id',
+                                                            type=int))
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(Asset.id < after)
+    limit = page_size(TIMELINE_PAGE_SIZE)
+    rows = query.order_by(Asset.id.desc()).limit(limit + 1).all()
+
+    return jsonify(
+        results=[{
+            'id': asset.id,
+            'name': asset.name,
+            'code': asset.code,
+            'holder': user.name,
+            'holder_id': user.id,
+            'assigned': assigned.isoformat(),
+        } for asset, user, assigned in rows[:limit]],
+        has_next=len(rows) > limit
+    )
@@ -1,11 +1,67 @@
+import time
 from functools import wraps
 
-from flask import Blueprint, flash, redirect, url_for, render_template
+from flask import Blueprint, flash, redirect, url_for, render_template, \
+    current_app
 from flask_login import current_user, login_required
 
-from app.models import Role
+from app.models import Role, User
 auth = Blueprint('auth', __name__)
 
+# the app is set up once the super admin exists. This never changes back, so
+# once it's known to be true the database doesn't need to be asked again
+_setup_complete = False
+
+
+def setup_complete():
+    """Check whether the app has been set up i.e. there are users"""
+    global _setup_complete
+    if not _setup_complete:
+        _setup_complete = User.any_exist()
+    return _setup_complete
+
+
+def mark_setup_complete():
+    global _setup_complete
+    _setup_complete = True
+
+
+# user id -> (expiry time, user snapshot)
+_identities = {}
+
+
+def load_identity(user_id):
+    """
+    Load the user for a request. If IDENTITY_CACHE_TTL is set, the user is
+    rebuilt from a snapshot kept for that many seconds instead of being
+    queried on every request. Each worker process has its own cache.
+    """
+    ttl = current_app.config.get('IDENTITY_CACHE_TTL')
+    if not ttl:
+        return User.load(user_id)
+
+    key = str(user_id)
+    cached = _identities.get(key)
+    if cached is not None and cached[0] > time.time():
+        return User.from_snapshot(cached[1])
+
+    user = User.load(user_id)
+    if user is None:
+        _identities.pop(key, None)
+    else:
+        _identities[key] = (time.time() + ttl, user.snapshot())
+    return user
+
+
+def forget_identity(user_id):
+    """
+    Drop the cached identity of a user. Call it whenever the user's details,
+    role or password change. Only the cache of the worker handling the
+    change is cleared, the other workers keep their snapshot until
+    IDENTITY_CACHE_TTL runs out.
+    """
+    _identities.pop(str(user_id), None)
+
 
 def guest_required(func):
     """
@@ -48,8 +104,8 @@ def role_required(role):
     def _role_required(func):
         @login_required
         def _check_role(*args, **kwargs):
-            required_role = Role.get(role)
-            if current_user.roles[0].level > required_role.level:
+            required_role = Role.registry().get(role)
+            if current_user.role.level > required_role.level:
                 return render_template('error/generic.html',
                                message="Only %ss are allowed to access this \
                                page" % required_role.title)
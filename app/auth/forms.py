@@ -1,5 +1,5 @@
 from wtforms import StringField, SubmitField, PasswordField,\
-    validators, SelectField
+    validators, SelectField, TextAreaField
 from flask_wtf import Form
 from app.models import User
 
@@ -45,6 +45,14 @@ class InviteForm(Form):
         return valid
 
 
+class BulkInviteForm(Form):
+    emails = TextAreaField("Emails, one per line",
+                           validators=[validators.DataRequired()])
+    role = SelectField("Role", coerce=int, validators=[validators.DataRequired()])
+
+    submit = SubmitField("Invite")
+
+
 class PasswordResetRequestForm(Form):
     email = StringField("Email", validators=[validators.Email()])
     submit = SubmitField("Send")
@@ -0,0 +1,92 @@
+""" Verify Google sign in tokens against a cache of Google's certificates"""
+import json
+import re
+import threading
+import time
+
+import httplib2
+from flask import current_app
+from oauth2client import client, crypt
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+# (certificates, time they expire), shared by the whole worker
+_certs = None
+_fetch_lock = threading.Lock()
+_refreshing = False
+
+
+def fetch_certs(url, timeout, min_ttl):
+    """
+    Fetch the certificates and work out when they expire from the response's
+    Cache-Control max-age, less its Age, keeping them at least min_ttl
+    seconds. Raises client.VerifyJwtTokenError if they can't be fetched.
+    """
+    http = httplib2.Http(timeout=timeout)
+    try:
+        resp, content = http.request(url)
+    except (httplib2.HttpLib2Error, IOError), e:
+        raise client.VerifyJwtTokenError('Fetching certificates failed: %s'
+                                         % e)
+    if resp.status != 200:
+        raise client.VerifyJwtTokenError('Status code: %d' % resp.status)
+
+    match = MAX_AGE_RE.search(resp.get('cache-control', ''))
+    max_age = int(match.group(1)) if match else 0
+    try:
+        max_age -= int(resp.get('age', 0))
+    except ValueError:
+        pass
+    # without a usable max-age every sign in would fetch them again
+    return json.loads(content), time.time() + max(max_age, min_ttl)
+
+
+def _refresh(url, timeout, min_ttl, logger):
+    global _certs, _refreshing
+    try:
+        _certs = fetch_certs(url, timeout, min_ttl)
+    except client.VerifyJwtTokenError:
+        # the current certificates stay in use until they expire
+        logger.exception("Refreshing Google certificates failed")
+    finally:
+        _refreshing = False
+
+
+def get_certs():
+    """
+    Return Google's current certificates. They're fetched when there are
+    none or they've expired, and refreshed in the background once they're
+    within GOOGLE_CERTS_REFRESH_MARGIN seconds of expiring, so sign ins
+    don't normally wait for Google.
+    """
+    global _certs, _refreshing
+    config = current_app.config
+    url = config['GOOGLE_CERTS_URL']
+    timeout = config['GOOGLE_CERTS_TIMEOUT']
+    min_ttl = config['GOOGLE_CERTS_MIN_TTL']
+
+    cached = _certs
+    now = time.time()
+    if cached is None or cached[1] <= now:
+        with _fetch_lock:
+            # another request may have fetched them while this one waited
+            cached = _certs
+            if cached is None or cached[1] <= time.time():
+                cached = _certs = fetch_certs(url, timeout, min_ttl)
+    elif cached[1] - now < config['GOOGLE_CERTS_REFRESH_MARGIN'] and \
+            not _refreshing:
+        _refreshing = True
+        thread = threading.Thread(target=_refresh, args=(
+            url, timeout, min_ttl, current_app.logger))
+        thread.daemon = True
+        thread.start()
+    return cached[0]
+
+
+def verify_id_token(id_token, audience):
+    """
+    Check an id token's signature and audience locally with the cached
+    certificates. Raises crypt.AppIdentityError if the token is invalid and
+    client.VerifyJwtTokenError if the certificates can't be fetched.
+    """
+    return crypt.verify_signed_jwt_with_certs(id_token, get_certs(), audience)
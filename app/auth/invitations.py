@@ -0,0 +1,81 @@
+""" Invitations for people to sign up, sent one or many at a time"""
+import re
+from datetime import datetime
+
+from flask import url_for
+
+from app import db
+from app.models import Invitation, OutboxEmail, User
+from app.auth.tokens import invitation_token
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s.][^@\s]*$')
+
+
+def invitation_email(invitee, token, sender):
+    """Return the send_email arguments for an invitation"""
+    # invite_link: http://<host>/signup?invite=<token>
+    invite_link = url_for('auth.signup', _external=True, invite=token)
+    return dict(
+        subject="Asset Tracker Invitation",
+        sender=(sender.name, sender.email),
+        recipients=[invitee],
+        body="You've been invited to join Asset Tracker. Follow \
+            this link to sign up: %s" % invite_link,
+        html="You've been invited to join Asset Tracker. Follow \
+            this link to sign up:<br> <a href=\"%s\">%s</a>" % \
+        (invite_link, invite_link)
+    )
+
+
+def split_addresses(text):
+    """Split addresses separated by new lines, commas or semicolons"""
+    return [address.strip() for address in re.split(r'[\s,;]+', text)
+            if address.strip()]
+
+
+def invite_many(addresses, role, sender):
+    """
+    Invite every address in one go: one query to find existing users, one
+    batch insert of invitations and one of queued emails. Returns a list of
+    (address, error) pairs where error is None for the addresses that were
+    invited. Nothing is committed.
+    """
+    results = []
+    invitees = []
+    seen = set()
+    for address in addresses:
+        if not EMAIL_RE.match(address):
+            results.append((address, "Invalid email address"))
+        elif address.lower() in seen:
+            results.append((address, "Listed more than once"))
+        else:
+            seen.add(address.lower())
+            invitees.append(address)
+
+    # addresses are compared ignoring case, as people type them either way
+    lowered = [address.lower() for address in invitees]
+    existing = set(email for email, in db.session.query(
+        db.func.lower(User.email)).filter(
+            db.func.lower(User.email).in_(lowered))) if invitees else set()
+    for address in invitees:
+        if address.lower() in existing:
+            results.append((address, "Email belongs to an existing user"))
+    invitees = [address for address in invitees
+                if address.lower() not in existing]
+    if not invitees:
+        return results
+
+    # (nonce, signed token) pairs
+    tokens = [invitation_token(address, role.id) for address in invitees]
+    now = datetime.now()
+    db.session.execute(Invitation.__table__.insert(), [
+        {'token': nonce, 'invitee': address, 'role_id': role.id,
+         'sender_id': sender.id, 'accepted': False, 'created': now}
+        for address, (nonce, _) in zip(invitees, tokens)
+    ])
+    db.session.bulk_save_objects([
+        OutboxEmail(**invitation_email(address, token, sender))
+        for address, (_, token) in zip(invitees, tokens)
+    ])
+    results.extend((address, None) for address in invitees)
+    return results
@@ -0,0 +1,91 @@
+""" Signed, expiring tokens for invitation and password reset links"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, BadData
+
+from app import db
+from app.models import Invitation, PasswordResetRequest
+from app.helpers import random_base64
+
+# rows deleted per transaction by purge_expired
+PURGE_BATCH_SIZE = 1000
+
+# nonce is the token column of the row that records whether the link was used
+InvitationToken = namedtuple('InvitationToken', 'nonce invitee role_id')
+PasswordResetToken = namedtuple('PasswordResetToken', 'nonce user_id email')
+
+
+def _serializer(salt):
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=salt)
+
+
+def _load(salt, token, max_age):
+    """The signed values in token, or None if it's invalid or expired"""
+    try:
+        return _serializer(salt).loads(token, max_age=max_age)
+    except (BadData, TypeError, ValueError):
+        return None
+
+
+def invitation_token(invitee, role_id):
+    """Return (nonce, signed token) for a new invitation"""
+    nonce = random_base64()
+    return nonce, _serializer('invitation').dumps([nonce, invitee, role_id])
+
+
+def load_invitation(token):
+    """
+    Check an invitation link without touching the database. Returns an
+    InvitationToken, or None if the token is invalid or expired.
+    """
+    values = _load('invitation', token,
+                   current_app.config['INVITATION_MAX_AGE'])
+    return InvitationToken(*values) if values else None
+
+
+def password_reset_token(user):
+    """Return (nonce, signed token) for a new password reset"""
+    nonce = random_base64()
+    return nonce, _serializer('password-reset').dumps(
+        [nonce, user.id, user.email])
+
+
+def load_password_reset(token):
+    """
+    Check a password reset link without touching the database. Returns a
+    PasswordResetToken, or None if the token is invalid or expired.
+    """
+    values = _load('password-reset', token,
+                   current_app.config['PASSWORD_RESET_MAX_AGE'])
+    return PasswordResetToken(*values) if values else None
+
+
+def purge_expired(batch_size=PURGE_BATCH_SIZE):
+    """
+    Delete the invitation and password reset rows whose links have been
+    used or have expired, batch_size rows per transaction so the tables
+    aren't locked for long. A link whose row is gone can't be used, so only
+    the pending ones need to be kept. Returns the number of rows deleted.
+    """
+    config = current_app.config
+    now = datetime.now()
+    purged = 0
+    for table, created, used, max_age in (
+            (Invitation.__table__, Invitation.created, Invitation.accepted,
+             config['INVITATION_MAX_AGE']),
+            (PasswordResetRequest.__table__, PasswordResetRequest.time,
+             PasswordResetRequest.used, config['PASSWORD_RESET_MAX_AGE'])):
+        cutoff = now - timedelta(seconds=max_age)
+        expired = db.select([table.c.id]) \
+            .where(db.or_(created < cutoff, used.is_(True))) \
+            .limit(batch_size)
+        while True:
+            deleted = db.session.execute(
+                table.delete().where(table.c.id.in_(expired))).rowcount
+            db.session.commit()
+            purged += deleted
+            if deleted < batch_size:
+                break
+    return purged
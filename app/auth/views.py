@@ -1,5 +1,4 @@
 import json
-from datetime import datetime
 
 from flask import render_template, redirect, url_for, flash, request, \
     current_app
@@ -9,15 +8,21 @@ from oauth2client import client, crypt
 
 from app import login_manager, db
 from app.models import User, Role, Invitation, GoogleUser, PasswordResetRequest
-from app.auth import auth, guest_required, role_required
+from app.auth import auth, guest_required, role_required, \
+    setup_complete, mark_setup_complete, load_identity, forget_identity
 from app.auth.forms import LoginForm, SignUpForm, InviteForm, \
-    PasswordResetForm, PasswordResetRequestForm
-from app.helpers import send_email, random_base64
+    BulkInviteForm, PasswordResetForm, PasswordResetRequestForm
+from app.auth.google import verify_id_token
+from app.auth.invitations import invitation_email, invite_many, \
+    split_addresses
+from app.auth.tokens import invitation_token, load_invitation, \
+    password_reset_token, load_password_reset
+from app.helpers import send_email
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.filter_by(id=user_id).first()
+    return load_identity(user_id)
 
 
 @login_manager.unauthorized_handler
@@ -28,7 +33,7 @@ def unauthorized():
 @auth.route('/setup', methods=['GET', 'POST'])
 def setup():
     # if there are users in the DB, the app is already set up
-    if User.query.all():
+    if setup_complete():
         return redirect(url_for('index'))
 
     form = SignUpForm()
@@ -36,6 +41,7 @@ def setup():
         user = User(form.email.data, form.password.data, form.name.data, 'superadmin')
         db.session.add(user)
         db.session.commit()
+        mark_setup_complete()
         login_user(user)
         flash("Super admin created successfully", 'success')
         return redirect(url_for('index'))
@@ -55,6 +61,8 @@ def login():
         # the method is POST and the form is valid
         user = User.query.filter_by(email=form.email.data).first()
         if user is not None and user.check_password(form.password.data):
+            # saves the password hash if it was upgraded
+            db.session.commit()
             login_user(user)
             url_for_next = request.args.get('next')
             # todo: validate url_for_next
@@ -80,38 +88,31 @@ def invite_user_old():
     return redirect(url_for('.invite_user'))
 
 
+def invitable_roles():
+    # users can only add users one privilege level below them
+    return [(role.id, role.title) for role in Role.registry().all()
+            if role.level > current_user.role.level]
+
+
 @auth.route('/invite', methods=['GET', 'POST'])
 @role_required('admin')
 def invite_user():
     form = InviteForm()
-    # users can only add users one privilege level below them
-    form.role.choices = [(role.id, role.title) for role in Role.query.all()
-                         if role.level > current_user.roles[0].level]
+    form.role.choices = invitable_roles()
     if form.validate_on_submit():
         # the method is POST and the form is valid
-        token = random_base64(lambda t: Invitation.get(t) is None)
+        nonce, token = invitation_token(form.email.data, form.role.data)
         invitation = Invitation(
-            token,
+            nonce,
             form.email.data,
-            Role.get_by_id(form.role.data),
+            Role.registry().get_by_id(form.role.data),
             current_user
         )
 
-        # invite_link: http://<host>/signup?invite=<token>
-        invite_link = url_for('auth.signup', _external=True, invite=token)
-
         # prepare and send invitation email
         try:
-            send_email(
-                subject="Asset Tracker Invitation",
-                sender=(current_user.name, current_user.email),
-                recipients=[form.email.data],
-                body="You've been invited to join Asset Tracker. Follow \
-                    this link to sign up: %s" % invite_link,
-                html="You've been invited to join Asset Tracker. Follow \
-                    this link to sign up:<br> <a href=\"%s\">%s</a>" % \
-                (invite_link, invite_link)
-            )
+            send_email(**invitation_email(form.email.data, token,
+                                          current_user))
             db.session.add(invitation)
             db.session.commit()
             flash("Invitation sent to %s" % form.email.data, 'success')
@@ -128,6 +129,27 @@ def invite_user():
     return render_template('auth/invite.html', form=form)
 
 
+@auth.route('/invite/bulk', methods=['GET', 'POST'])
+@role_required('admin')
+def invite_many_users():
+    form = BulkInviteForm()
+    form.role.choices = invitable_roles()
+    results = None
+    if form.validate_on_submit():
+        results = invite_many(split_addresses(form.emails.data),
+                              Role.registry().get_by_id(form.role.data),
+                              current_user)
+        db.session.commit()
+        invited = len([error for _, error in results if error is None])
+        flash("%d invitations sent, %d failed. You'll get an email about "
+              "any that can't be delivered"
+              % (invited, len(results) - invited),
+              'success' if invited == len(results) else 'warning')
+
+    return render_template('auth/invite_bulk.html', form=form,
+                           results=results, heading="Invite several people")
+
+
 @auth.route('/users/signup', methods=['GET', 'POST'])
 @guest_required
 def signup_old():
@@ -139,12 +161,12 @@ def signup_old():
 def signup():
     form = SignUpForm()
     token = request.args.get('invite')
-    invite = Invitation.get(token)
+    invite = load_invitation(token) if token else None
 
     if token and not invite:
         return render_template(
             'error/generic.html',
-            message="The invite is invalid"
+            message="The invite is invalid or has expired"
         )
 
     if invite is not None:
@@ -158,12 +180,18 @@ def signup():
         if invite is None:
             role_short = 'staff'
         else:
-            role_short = invite.role.short
+            role_short = Role.registry().get_by_id(invite.role_id).short
             if form.email.data != invite.invitee:
                 return render_template(
                     'error/generic.html',
                     message="Email doesn't match invite email"
                 )
+            if not Invitation.accept(invite.nonce, invite.invitee,
+                                     invite.role_id):
+                return render_template(
+                    'error/generic.html',
+                    message="The invite is invalid or has already been used"
+                )
 
         user = User(form.email.data, form.password.data, form.name.data, role_short)
         db.session.add(user)
@@ -188,7 +216,7 @@ def google_sign_in():
         return redirect(url_for('auth.login', next=request.args.get('next')))
 
     try:
-        id_info = client.verify_id_token(id_token, current_app.config['GOOGLE_CLIENT_ID'])
+        id_info = verify_id_token(id_token, current_app.config['GOOGLE_CLIENT_ID'])
         if id_info['aud'] != current_app.config['GOOGLE_WEB_CLIENT_ID']:
             raise crypt.AppIdentityError("Unrecognized client.")
         if id_info['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
@@ -199,6 +227,11 @@ def google_sign_in():
     except crypt.AppIdentityError:
         flash("Invalid Google sign in token for ", "danger")
         return redirect(url_for('auth.login', next=request.args.get('next'))), 400
+    except client.VerifyJwtTokenError:
+        current_app.logger.exception("Fetching Google certificates failed")
+        flash("Google sign in isn't available right now, please try again "
+              "later", "danger")
+        return redirect(url_for('auth.login', next=request.args.get('next'))), 503
 
     google_id = id_info['sub']
     google_user = GoogleUser.query.filter_by(google_id=google_id).first()
@@ -230,9 +263,8 @@ def google_sign_in():
 def password_reset_request():
     form = PasswordResetRequestForm()
     if form.validate_on_submit():
-        def accept(t):
-            return PasswordResetRequest.query.filter_by(token=t).first() is None
-        token = random_base64(accept)
+        user = User.query.filter_by(email=form.email.data).first()
+        nonce, token = password_reset_token(user)
         reset_link = url_for('auth.password_reset', _external=True, token=token)
         try:
             send_email(
@@ -245,10 +277,7 @@ def password_reset_request():
                      %s</a> <br><br>This link will expire in 24 hours" %
                      (reset_link, reset_link)
             )
-            entry = PasswordResetRequest(
-                token,
-                User.query.filter_by(email=form.email.data).first()
-            )
+            entry = PasswordResetRequest(nonce, user)
             db.session.add(entry)
             db.session.commit()
             flash("A link to reset your password has been sent to %s" %
@@ -272,29 +301,28 @@ def password_reset_request():
 @auth.route('/password_reset/<token>', methods=['GET', 'POST'])
 @guest_required
 def password_reset(token=None):
-    reset_request = PasswordResetRequest.query.filter_by(token=token).first()
-    if (reset_request is None) or reset_request.used:
-        flash("Invalid password reset link", "danger")
+    reset_request = load_password_reset(token)
+    if reset_request is None:
+        flash("Invalid or expired password reset link", "danger")
         return redirect(url_for('.password_reset_request'))
 
     form = PasswordResetForm()
     if form.validate_on_submit():
-        delta = datetime.now() - reset_request.time
-        if delta.days > 0:
-            flash("Trying to use expired password reset token", "danger")
-            return redirect(url_for('.password_reset_request'))
-
-        user = reset_request.user
-        if user.email != form.email.data:
+        if reset_request.email != form.email.data:
             flash("Email doesn't match password reset link", "danger")
             return render_template("auth/password_reset.html",
                                    form=form,
                                    token=token)
 
+        user = User.query.get(reset_request.user_id)
+        if user is None or user.email != reset_request.email or \
+                not PasswordResetRequest.use(reset_request.nonce):
+            flash("Invalid password reset link", "danger")
+            return redirect(url_for('.password_reset_request'))
+
         user.set_password(form.password.data)
-        reset_request.used = True
-        db.session.add_all([user, reset_request])
         db.session.commit()
+        forget_identity(user.id)
         flash("Your password has been changed", "success")
         return redirect(url_for('.login'))
 
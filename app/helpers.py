@@ -1,19 +1,26 @@
 """ Helper functions"""
-from flask_mail import Message
-from app import mail
+from app import db
+from app.models import OutboxEmail
 
 import base64
+import itertools
+import json
 import os
 
 
 def send_email(**kwargs):
-    msg = Message(
+    """
+    Queue an email in the outbox. It's saved with the rest of the session
+    and sent by the maintenance worker (manage.py maintenance), or by
+    manage.py outbox where that runs instead
+    """
+    db.session.add(OutboxEmail(
         kwargs.get('subject'),
-        sender=kwargs.get('sender'),
-        recipients=kwargs.get('recipients'))
-    msg.body = kwargs.get('body')
-    msg.html = kwargs.get('html')
-    mail.send(msg)
+        kwargs.get('sender'),
+        kwargs.get('recipients'),
+        kwargs.get('body'),
+        kwargs.get('html')
+    ))
 
 
 def random_base64(accept_function=lambda token: True):
@@ -21,3 +28,26 @@ def random_base64(accept_function=lambda token: True):
         token = base64.urlsafe_b64encode(os.urandom(24))
         if accept_function(token):
             return token
+
+
+def json_array_stream(items):
+    """
+    Yield the JSON encoding of an iterable as a series of chunks so that a
+    list can be sent to the client without building it in memory first.
+    """
+    yield '['
+    for index, item in enumerate(items):
+        if index:
+            yield ','
+        yield json.dumps(item)
+    yield ']'
+
+
+def chunks(iterable, size):
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
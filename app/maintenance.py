@@ -0,0 +1,98 @@
+""" Periodic upkeep run by the worker process (manage.py maintenance)"""
+import logging
+import time
+from collections import namedtuple
+
+from app import db
+from app.auth.tokens import purge_expired
+from app.outbox import deliver_due, purge_done, OUTBOX_BATCH_SIZE, \
+    OUTBOX_POLL_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# seconds between runs of the slower jobs
+PURGE_INTERVAL = 3600
+TABLE_STATS_INTERVAL = 3600
+# smaller tables are left to autovacuum
+TABLE_STATS_MIN_ROWS = 10000
+# share of a table's rows changed since it was last analyzed, or dead, before
+# it's analyzed or vacuumed
+ANALYZE_CHANGED_FRACTION = 0.1
+VACUUM_DEAD_FRACTION = 0.2
+
+# level is the level durations are logged at
+Job = namedtuple('Job', 'name interval func level')
+
+
+def send_outbox():
+    """Send every due email. Returns the number attempted."""
+    attempted = sent = deliver_due()
+    while attempted == OUTBOX_BATCH_SIZE:
+        attempted = deliver_due()
+        sent += attempted
+    return sent
+
+
+def table_stats():
+    """
+    ANALYZE the large tables that changed a lot since their statistics were
+    last gathered, and VACUUM ANALYZE the ones with many dead rows. Returns
+    the statements run.
+    """
+    rows = db.session.execute(
+        "SELECT relname, n_live_tup, n_dead_tup, n_mod_since_analyze "
+        "FROM pg_stat_user_tables WHERE schemaname = 'public' "
+        "AND n_live_tup >= :min_rows ORDER BY relname",
+        {'min_rows': TABLE_STATS_MIN_ROWS}).fetchall()
+    db.session.commit()
+
+    statements = []
+    quote = db.engine.dialect.identifier_preparer.quote
+    for name, live, dead, changed in rows:
+        if dead > live * VACUUM_DEAD_FRACTION:
+            statements.append("VACUUM ANALYZE %s" % quote(name))
+        elif changed > live * ANALYZE_CHANGED_FRACTION:
+            statements.append("ANALYZE %s" % quote(name))
+    if statements:
+        # VACUUM can't run inside a transaction
+        with db.engine.connect() as connection:
+            connection = connection.execution_options(
+                isolation_level='AUTOCOMMIT')
+            for statement in statements:
+                connection.execute(statement)
+    return statements
+
+
+JOBS = (
+    Job('outbox', OUTBOX_POLL_INTERVAL, send_outbox, logging.DEBUG),
+    Job('purge_tokens', PURGE_INTERVAL, purge_expired, logging.INFO),
+    Job('purge_outbox', PURGE_INTERVAL, purge_done, logging.INFO),
+    Job('table_stats', TABLE_STATS_INTERVAL, table_stats, logging.INFO),
+)
+
+
+def run_job(job):
+    started = time.time()
+    try:
+        result = job.func()
+    except Exception:
+        logger.exception("%s failed after %.2fs", job.name,
+                         time.time() - started)
+        db.session.rollback()
+    else:
+        logger.log(job.level, "%s: %s in %.2fs", job.name, result,
+                   time.time() - started)
+
+
+def run_scheduler(jobs=JOBS):
+    """
+    Run each job every job.interval seconds until interrupted. Jobs run one
+    at a time, so a slow one delays the others rather than overlapping them.
+    """
+    due = dict((job.name, time.time()) for job in jobs)
+    while True:
+        for job in jobs:
+            if due[job.name] <= time.time():
+                run_job(job)
+                due[job.name] = time.time() + job.interval
+        time.sleep(max(0, min(due.values()) - time.time()))
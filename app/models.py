@@ -1,28 +1,57 @@
-from datetime import datetime
-from werkzeug.security import generate_password_hash, \
-    check_password_hash
+import json
+import re
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from email.utils import formataddr
+from flask import current_app
 from flask_login import UserMixin, current_user
-from app import db
+from flask_mail import Message
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import manager_of_class
+from app import db, passwords
 
 roles = db.Table(
     'roles',
     db.Column('role_id', db.Integer, db.ForeignKey('role.id')),
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id'))
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), index=True)
 )
 
-assignment = db.Table(
-    'assignment',
-    db.Column('asset_id', db.Integer, db.ForeignKey('asset.id')),
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
+# full text search document of an asset. Codes and serial numbers are also
+# split on punctuation so parts of them can be searched for. The
+# ix_asset_search index is built on this exact expression, so it has to be
+# changed with a migration
+ASSET_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', "
+    "coalesce(asset.name, '') || ' ' || "
+    "coalesce(asset.code, '') || ' ' || "
+    "coalesce(asset.serial_no, '') || ' ' || "
+    "regexp_replace(coalesce(asset.code, '') || ' ' || "
+    "coalesce(asset.serial_no, ''), '\\W+', ' ', 'g')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(asset.type, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(asset.description, '')), 'C')"
 )
 
+# full text search document of a user, the email is also split on
+# punctuation. The ix_user_search index is built on this exact expression
+USER_SEARCH_VECTOR = (
+    "to_tsvector('simple', "
+    "coalesce(\"user\".name, '') || ' ' || "
+    "coalesce(\"user\".email, '') || ' ' || "
+    "regexp_replace(coalesce(\"user\".email, ''), '\\W+', ' ', 'g'))"
+)
+
+# a return date is near when it's no more than this many whole days away
+RETURN_DATE_NEAR_DAYS = 2
+
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True)
-    password = db.Column(db.String(66))
+    password = db.Column(db.String(255))
     name = db.Column(db.String(255))
     profile_pic_url = db.Column(db.String(255))
+    # content hash of the uploaded profile picture, see app.account.avatars
+    avatar = db.Column(db.String(40))
     roles = db.relationship(
         'Role',
         secondary=roles,
@@ -35,41 +64,181 @@ class User(db.Model, UserMixin):
     )
     assets_added = db.relationship(
         'Asset',
+        foreign_keys='Asset.added_by_id',
         backref=db.backref('added_by', lazy='joined'),
         lazy='dynamic',
     )
     assets_assigned = db.relationship(
         'Asset',
-        secondary=assignment,
-        backref=db.backref('assigned_to', lazy='dynamic')
+        foreign_keys='Asset.assignee_id',
+        backref=db.backref('assignee', lazy='joined'),
+        lazy='dynamic',
     )
     google_id = db.relationship(
         'GoogleUser',
         backref=db.backref('user', lazy='joined', uselist=False),
         uselist=False,
-        lazy='joined',
     )
 
+    # registry entry for the user's role, see the role property
+    _role = None
+    # whether the user signed up with Google, see the has_google_account
+    # property
+    _has_google_account = None
+
     def __init__(self, email, password, name, role_short='staff'):
         self.email = email
-        self.password = generate_password_hash(password) if password else None
+        self.password = passwords.hash_password(password) if password \
+            else None
         self.name = name
-        role = Role.get(role_short)
-        role.users.append(self)
+        self._role = Role.registry().get(role_short)
+        self.roles.append(self._role.instance())
+        Counter.count('users')
+        Counter.count(Counter.ROLES[role_short])
+
+    __table_args__ = (
+        # the user directory is ordered by name
+        db.Index('ix_user_name_id', 'name', 'id'),
+    )
+
+    @staticmethod
+    def any_exist():
+        return db.session.query(User.query.exists()).scalar()
+
+    @staticmethod
+    def search(text, query=None):
+        """
+        Full text search of users. Every word in text has to match the
+        start of a word in the name or email of a user.
+        """
+        query = query or User.query
+        ts_query = prefix_tsquery(text)
+        if ts_query is None:
+            return query.filter(db.false())
+        return query.filter(
+            db.literal_column(USER_SEARCH_VECTOR).op('@@')(ts_query))
+
+    @staticmethod
+    def with_role(role_short, query=None):
+        """Narrow a users query down to the users with a role"""
+        query = query or User.query
+        return query.join(roles).filter(
+            roles.c.role_id == Role.registry().get(role_short).id)
+
+    @staticmethod
+    def directory(text=None, role_short=None, offset=0, limit=20):
+        """
+        Return a page of users ordered by name as (user, role, number of
+        assets held) tuples. The page of user ids is picked first, then
+        their roles and asset counts are added with one grouped join, so
+        only the users on the page are counted.
+        """
+        query = db.session.query(User.id)
+        if text:
+            query = User.search(text, query)
+        if role_short:
+            query = User.with_role(role_short, query)
+        page = query.order_by(User.name, User.id) \
+            .offset(offset).limit(limit).subquery()
+
+        rows = db.session.query(
+            User, roles.c.role_id, db.func.count(Asset.id)
+        ).join(page, page.c.id == User.id) \
+            .outerjoin(roles, roles.c.user_id == User.id) \
+            .outerjoin(Asset, Asset.assignee_id == User.id) \
+            .group_by(User.id, roles.c.role_id) \
+            .order_by(User.name, User.id)
+        registry = Role.registry()
+        return [(user, registry.get_by_id(role_id), held)
+                for user, role_id, held in rows]
+
+    @staticmethod
+    def load(user_id):
+        """
+        Load a user along with their role id and Google account id in one
+        query and attach the matching role registry entry, so that
+        permission checks on the user don't query the database
+        """
+        row = db.session.query(User, roles.c.role_id, GoogleUser.id) \
+            .outerjoin(roles).outerjoin(GoogleUser) \
+            .filter(User.id == user_id).first()
+        if row is None:
+            return None
+        user, role_id, google_user_id = row
+        user._role = Role.registry().get_by_id(role_id)
+        user._has_google_account = google_user_id is not None
+        return user
+
+    # columns left out of snapshots. They're loaded from the database if a
+    # user rebuilt from a snapshot needs them
+    SNAPSHOT_EXCLUDE = ('password',)
+
+    def snapshot(self):
+        """
+        Return the user's columns, except the password hash, and precomputed
+        role and Google account flags in a plain dict which can be kept
+        between requests
+        """
+        values = dict((column.key, getattr(self, column.key))
+                      for column in User.__table__.columns
+                      if column.key not in User.SNAPSHOT_EXCLUDE)
+        values['_role'] = self.role
+        values['_has_google_account'] = self.has_google_account
+        return values
+
+    @staticmethod
+    def from_snapshot(values):
+        """Rebuild a user in the session from a snapshot without a query"""
+        values = dict(values)
+        role = values.pop('_role')
+        has_google_account = values.pop('_has_google_account')
+        user = manager_of_class(User).new_instance()
+        for key, value in values.items():
+            setattr(user, key, value)
+        make_transient_to_detached(user)
+        user = db.session.merge(user, load=False)
+        # loaded on first access
+        db.session.expire(user, list(User.SNAPSHOT_EXCLUDE))
+        user._role = role
+        user._has_google_account = has_google_account
+        return user
+
+    @property
+    def role(self):
+        """The registry entry for the user's role"""
+        if self._role is None:
+            self._role = Role.registry().get_by_id(self.roles[0].id)
+        return self._role
+
+    @property
+    def has_google_account(self):
+        if self._has_google_account is None:
+            self._has_google_account = self.google_id is not None
+        return self._has_google_account
 
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = passwords.hash_password(password)
 
     def check_password(self, password):
-        return self.password and check_password_hash(self.password, password)
+        """
+        Check a password. A hash made with an older method is replaced by
+        one made with the configured method, so the caller should commit
+        after a successful check.
+        """
+        if not self.password or \
+                not passwords.check_password(self.password, password):
+            return False
+        if passwords.needs_rehash(self.password):
+            self.set_password(password)
+        return True
 
     @property
     def is_admin(self):
-        return self.roles[0].short == 'admin'
+        return self.role.short == 'admin'
 
     @property
     def is_super(self):
-        return self.roles[0].short == 'superadmin'
+        return self.role.short == 'superadmin'
 
     @property
     def has_admin(self):
@@ -77,13 +246,13 @@ class User(db.Model, UserMixin):
 
     @property
     def is_staff(self):
-        return self.roles[0].short == 'staff'
+        return self.role.short == 'staff'
 
 
 class GoogleUser(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     google_id = db.Column(db.String(32), unique=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
 
     def __init__(self, google_id, user):
         self.google_id = google_id
@@ -116,24 +285,88 @@ class Role(db.Model):
     def get_by_id(role_id):
         return Role.query.filter_by(id=role_id).first()
 
+    @staticmethod
+    def registry():
+        """Return the role registry, loading it on first use"""
+        global _role_registry
+        if _role_registry is None:
+            _role_registry = RoleRegistry(
+                RoleInfo(role.id, role.short, role.title, role.description,
+                         role.level)
+                for role in Role.query.order_by(Role.level)
+            )
+        return _role_registry
+
+    @staticmethod
+    def invalidate_registry():
+        """Drop the role registry so it's reloaded on next use"""
+        global _role_registry
+        _role_registry = None
+
+
+class RoleInfo(namedtuple('RoleInfo',
+                          'id short title description level')):
+    """Read only copy of a role row, safe to share between requests"""
+    __slots__ = ()
+
+    def instance(self):
+        """Return the Role for this entry in the session without a query"""
+        role = Role(self.short, self.title, self.description, self.level)
+        role.id = self.id
+        make_transient_to_detached(role)
+        return db.session.merge(role, load=False)
+
+
+class RoleRegistry(object):
+    """
+    The roles rarely change so they're loaded once per process and looked up
+    from memory. Call Role.invalidate_registry after changing the role table.
+    """
+
+    def __init__(self, roles):
+        self._roles = tuple(roles)
+        self._by_short = dict((role.short, role) for role in self._roles)
+        self._by_id = dict((role.id, role) for role in self._roles)
+
+    def get(self, short):
+        return self._by_short.get(short)
+
+    def get_by_id(self, role_id):
+        return self._by_id.get(role_id)
+
+    def all(self):
+        return self._roles
+
+_role_registry = None
+
 
 class Invitation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    # nonce of the signed invitation link, see app.auth.tokens
     token = db.Column(db.String(32), unique=True)
     invitee = db.Column(db.String(255))
     role_id = db.Column(db.Integer, db.ForeignKey('role.id'))
-    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     accepted = db.Column(db.Boolean, default=False)
+    created = db.Column(db.DateTime, index=True)
 
     def __init__(self, token, invitee, role, sender):
         self.token = token
         self.invitee = invitee
+        self.role_id = role.id
+        self.created = datetime.now()
         sender.invites.append(self)
-        role.invites.append(self)
 
     @staticmethod
-    def get(token):
-        return Invitation.query.filter_by(token=token).first()
+    def accept(token, invitee, role_id):
+        """
+        Mark the invitation accepted. Returns False if it already was,
+        doesn't exist any more, or was made for another invitee or role:
+        the row, not the link, says who was invited as what.
+        """
+        return Invitation.query.filter_by(
+            token=token, invitee=invitee, role_id=role_id, accepted=False
+        ).update({'accepted': True}, synchronize_session=False) == 1
 
 
 class Asset(db.Model):
@@ -144,9 +377,25 @@ class Asset(db.Model):
     serial_no = db.Column(db.String(64))
     code = db.Column(db.String(64), unique=True)
     purchased = db.Column(db.DateTime)
-    added_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    return_date = db.Column(db.DateTime)
+    added_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    # the current holder. Past and present assignments are kept in
+    # AssignmentHistory
+    assignee_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    return_date = db.Column(db.DateTime, index=True)
     lost = db.Column(db.Boolean, default=False)
+    # inventory version of the last change, see touch
+    version = db.Column(db.Integer, nullable=False, default=0, index=True)
+    history = db.relationship(
+        'AssignmentHistory',
+        backref=db.backref('asset', lazy='joined'),
+        order_by='AssignmentHistory.id.desc()',
+        lazy='dynamic',
+    )
+
+    __table_args__ = (
+        # few assets are lost, so only those are indexed
+        db.Index('ix_asset_lost', 'lost', postgresql_where=db.text('lost')),
+    )
 
     def __init__(self, name, asset_type, description, serial_no, code, purchased,
                  added_by):
@@ -158,32 +407,56 @@ class Asset(db.Model):
         self.purchased = purchased
         self.return_date = None
         added_by.assets_added.append(self)
+        self.assignee_id = None
+        Counter.count('assets')
+        self.touch()
 
     def assign(self, assignee, return_date):
         self.return_date = return_date
-        self.assigned_to.append(assignee)
+        self.assignee = assignee
+        self.history.append(AssignmentHistory(assignee))
+        Counter.count('assigned')
+        self.touch()
 
     def reclaim(self):
+        AssignmentHistory.query.filter_by(
+            asset_id=self.id, returned_at=None
+        ).update({'returned_at': datetime.now()}, synchronize_session=False)
         self.return_date = None
-        self.assigned_to.remove(self.assignee)
+        self.assignee = None
+        Counter.count('assigned', -1)
+        self.touch()
 
     def set_lost(self, lost):
         self.lost = lost
+        self.touch()
+
+    def touch(self):
+        """
+        Give the asset the next inventory version, so it shows up in the
+        changes since any older version. The counter row stays locked until
+        the transaction ends, so versions are handed out in commit order.
+
+        That lock serializes every transaction that changes an asset: the
+        next one waits here until the previous one ends. A sequence wouldn't
+        wait, but it hands out numbers in call order rather than commit
+        order, so a client could read version n and never see a change that
+        commits later with a lower version. Asset writes are few and short
+        next to reads, imports commit chunk by chunk, so transactions that
+        touch assets should keep doing little else.
+        """
+        self.version = Counter.incr('inventory')
 
     def check_assignee(self, user):
-        return self.is_assigned and self.assignee.id == user.id
-
-    @property
-    def assignee(self):
-        return self.assigned_to.first()
+        return self.is_assigned and self.assignee_id == user.id
 
     @property
     def is_assigned(self):
-        return self.assignee is not None
+        return self.assignee_id is not None
 
     @property
     def purchased_date(self):
-        return self.purchased.strftime("%d, %b %Y")
+        return self.purchased and self.purchased.strftime("%d, %b %Y")
 
     @property
     def return_date_(self):
@@ -198,11 +471,13 @@ class Asset(db.Model):
         if not self.return_date:
             return None
         delta = self.return_date - datetime.now()
-        return not self.return_date_past and delta.days <= 2
+        return not self.return_date_past and \
+            delta.days <= RETURN_DATE_NEAR_DAYS
 
     @property
     def serialize(self):
         """Return object data in easily serializeable format"""
+        assignee = self.assignee
         return {
             'id': self.id,
             'name': self.name,
@@ -213,20 +488,214 @@ class Asset(db.Model):
             'purchased_date': self.purchased_date,
             'return_date_': self.return_date_,
             'lost': self.lost,
-            'is_assigned': self.is_assigned,
-            'assignee': self.assignee and self.assignee.name,
+            'is_assigned': assignee is not None,
+            'assignee': assignee and assignee.name,
             'return_date_past': self.return_date_past,
             'return_date_near': self.return_date_near,
-            'is_mine': self.check_assignee(current_user),
+            'is_mine': assignee is not None and assignee.id == current_user.id,
             'added_by': self.added_by.name,
         }
 
+    @staticmethod
+    def search(text, query=None):
+        """
+        Full text search of assets, best matches first. Every word in text
+        has to match the start of a word in the name, type, description,
+        serial number or code of an asset.
+        """
+        query = query or Asset.query
+        ts_query = prefix_tsquery(text)
+        if ts_query is None:
+            return query.filter(db.false())
+
+        vector = db.literal_column(ASSET_SEARCH_VECTOR)
+        return query.filter(vector.op('@@')(ts_query)).order_by(
+            db.func.ts_rank(vector, ts_query).desc(), Asset.id.desc())
+
+    @staticmethod
+    def serialize_all(assets):
+        """
+        Serialize a list of assets. Assignees are eager loaded with the
+        assets, so this doesn't query the database
+        """
+        return [asset.serialize for asset in assets]
+
+
+def prefix_tsquery(text):
+    """
+    Return a tsquery matching documents that have a word starting with each
+    word of text, or None if text has no words
+    """
+    # quote each word so tsquery operators in it are taken literally
+    words = ["'%s':*" % re.sub(r"[\\':]", '', word) for word in text.split()]
+    words = [word for word in words if word != "'':*"]
+    if not words:
+        return None
+    return db.func.to_tsquery(db.literal_column("'simple'"),
+                              ' & '.join(words))
+
+
+class AssignmentHistory(db.Model):
+    """
+    A past or present assignment of an asset. Rows are added when an asset is
+    assigned and get a returned_at when it's reclaimed, they are never
+    deleted
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('asset.id'),
+                         nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True,
+                        nullable=False)
+    # null for assignments made before the history was kept
+    assigned_at = db.Column(db.DateTime)
+    returned_at = db.Column(db.DateTime)
+    user = db.relationship('User', lazy='joined')
+
+    __table_args__ = (
+        db.Index('ix_assignment_history_asset_id', 'asset_id'),
+        # at most one open assignment per asset
+        db.Index('ix_assignment_history_open', 'asset_id', unique=True,
+                 postgresql_where=db.text('returned_at IS NULL')),
+    )
+
+    def __init__(self, user):
+        self.user = user
+        self.assigned_at = datetime.now()
+
+
+class AssetEvent(db.Model):
+    """
+    An append-only log of what happened to assets. user is the staff member
+    an assign, reclaim or loss is about and actor is whoever did it.
+    """
+    KINDS = ('add', 'assign', 'reclaim', 'lost', 'found', 'edit')
+    # the events that change who holds an asset
+    HOLDING_KINDS = ('assign', 'reclaim')
+    # asset columns whose changes are recorded by edit events
+    EDIT_FIELDS = ('name', 'type', 'description', 'serial_no', 'code',
+                   'purchased')
+
+    id = db.Column(db.Integer, primary_key=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('asset.id'),
+                         nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    actor_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    kind = db.Column(db.String(8), nullable=False)
+    ts = db.Column(db.DateTime, nullable=False)
+    # JSON object of the changed fields' old and new values for edits
+    details = db.Column(db.Text)
+    asset = db.relationship('Asset', lazy='joined')
+    user = db.relationship('User', foreign_keys=user_id, lazy='joined')
+    actor = db.relationship('User', foreign_keys=actor_id, lazy='joined')
+
+    __table_args__ = (
+        db.Index('ix_asset_event_asset_id_ts', 'asset_id', 'ts'),
+        db.Index('ix_asset_event_user_id_ts', 'user_id', 'ts'),
+    )
+
+    def __init__(self, kind, asset, actor, user=None, details=None):
+        self.kind = kind
+        self.asset = asset
+        self.actor = actor
+        self.user = user
+        self.details = details and json.dumps(details)
+        self.ts = datetime.now()
+
+    @staticmethod
+    def edited(asset, actor):
+        """
+        Return an edit event with the changes made to asset since it was
+        loaded, or None if nothing changed. Call it before committing.
+        """
+        state = db.inspect(asset)
+        changes = {}
+        for field in AssetEvent.EDIT_FIELDS:
+            history = state.attrs[field].history
+            if not history.has_changes():
+                continue
+            old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            if export_value(old) != export_value(new):
+                changes[field] = [export_value(old), export_value(new)]
+        if not changes:
+            return None
+        return AssetEvent('edit', asset, actor, details=changes)
+
+    @staticmethod
+    def timeline(query, before=None, limit=20):
+        """
+        Page through events newest first. before is the id of the last
+        event of the previous page.
+        """
+        query = query.order_by(AssetEvent.ts.desc(), AssetEvent.id.desc())
+        if before is not None:
+            last = db.session.query(AssetEvent.ts, AssetEvent.id) \
+                .filter(AssetEvent.id == before).first()
+            if last is not None:
+                query = query.filter(
+                    db.tuple_(AssetEvent.ts, AssetEvent.id) < tuple(last))
+        return query.limit(limit)
+
+    @staticmethod
+    def holders_as_of(when, user_id=None):
+        """
+        Return a query for the (asset, user, assigned at) rows of the
+        assets that were assigned just before a point in time, optionally
+        only those held by one user. Each asset's last assign or reclaim
+        before then is looked up
+        through the (asset_id, ts) index, so the cost depends on the
+        number of assets rather than the size of the log.
+        """
+        last = db.session.query(AssetEvent.id).filter(
+            AssetEvent.asset_id == Asset.id,
+            AssetEvent.ts < when,
+            AssetEvent.kind.in_(AssetEvent.HOLDING_KINDS),
+        ).order_by(AssetEvent.ts.desc(), AssetEvent.id.desc()) \
+            .limit(1).correlate(Asset).as_scalar()
+        query = db.session.query(Asset, User, AssetEvent.ts) \
+            .join(AssetEvent, AssetEvent.id == last) \
+            .join(User, User.id == AssetEvent.user_id) \
+            .filter(AssetEvent.kind == 'assign')
+        if user_id is not None:
+            # only look at the assets the user ever had, found through the
+            # (user_id, ts) index
+            held = db.session.query(AssetEvent.asset_id).filter(
+                AssetEvent.user_id == user_id,
+                AssetEvent.ts < when,
+                AssetEvent.kind == 'assign',
+            )
+            query = query.filter(Asset.id.in_(held), User.id == user_id)
+        return query
+
+    @property
+    def serialize(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'ts': self.ts.isoformat(),
+            'asset_id': self.asset_id,
+            'asset': self.asset.name,
+            'asset_code': self.asset.code,
+            'user': self.user and self.user.name,
+            'user_id': self.user_id,
+            'actor': self.actor and self.actor.name,
+            'details': self.details and json.loads(self.details),
+        }
+
+
+def export_value(value):
+    """Return a JSON friendly version of an asset column value"""
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return value
+
 
 class PasswordResetRequest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    # nonce of the signed password reset link, see app.auth.tokens
     token = db.Column(db.String(32), unique=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    time = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    time = db.Column(db.DateTime, index=True)
     used = db.Column(db.Boolean, default=False)
     user = db.relationship('User', foreign_keys=user_id)
 
@@ -234,3 +703,153 @@ class PasswordResetRequest(db.Model):
         self.token = token
         self.user = user
         self.time = datetime.now()
+
+    @staticmethod
+    def use(token):
+        """
+        Mark the request used. Returns False if it already was or doesn't
+        exist any more.
+        """
+        return PasswordResetRequest.query \
+            .filter_by(token=token, used=False) \
+            .update({'used': True}, synchronize_session=False) == 1
+
+
+class OutboxEmail(db.Model):
+    """An email queued for sending, see app.outbox"""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255))
+    sender = db.Column(db.String(255))
+    # JSON list of addresses
+    recipients = db.Column(db.Text)
+    body = db.Column(db.Text)
+    html = db.Column(db.Text)
+    created = db.Column(db.DateTime)
+    # when to try sending next, None once sent or given up on
+    due = db.Column(db.DateTime, index=True)
+    attempts = db.Column(db.Integer, default=0)
+    sent = db.Column(db.DateTime)
+    error = db.Column(db.String(255))
+
+    def __init__(self, subject, sender, recipients, body, html):
+        self.subject = subject
+        if isinstance(sender, tuple):
+            sender = formataddr(sender)
+        self.sender = sender
+        self.recipients = json.dumps(recipients)
+        self.body = body
+        self.html = html
+        self.created = self.due = datetime.now()
+        self.attempts = 0
+
+    def message(self):
+        msg = Message(self.subject, sender=self.sender,
+                      recipients=json.loads(self.recipients))
+        msg.body = self.body
+        msg.html = self.html
+        return msg
+
+    def delivered(self):
+        self.attempts += 1
+        self.sent = datetime.now()
+        self.due = None
+        self.error = None
+
+    def failed(self, error, retry_delay, max_attempts):
+        """
+        Record a failed attempt and schedule a retry, waiting twice as long
+        after each attempt. Gives up after max_attempts.
+        """
+        self.attempts += 1
+        self.error = ('%s: %s' % (error.__class__.__name__, error))[:255]
+        if self.attempts >= max_attempts:
+            self.due = None
+        else:
+            self.due = datetime.now() + timedelta(
+                seconds=retry_delay * 2 ** (self.attempts - 1))
+
+
+class Reminder(db.Model):
+    """A return date reminder that has been sent about an assignment"""
+    id = db.Column(db.Integer, primary_key=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('asset.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    return_date = db.Column(db.DateTime)
+    # 'near' or 'past'
+    kind = db.Column(db.String(8))
+    sent = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('asset_id', 'user_id', 'return_date', 'kind'),
+    )
+
+
+class Counter(db.Model):
+    """
+    Cached dashboard counts. When DASHBOARD_COUNTER_CACHE is on they are
+    kept up to date by the model methods that add users and assets or change
+    assignments, so reading the dashboard does not depend on the size of the
+    tables. When it's off they aren't touched at all, so writers don't
+    contend for the counter rows.
+
+    The inventory counter isn't a count but a version number of the asset
+    lists. It goes up on every change to an asset, see Asset.touch and the
+    ETags and deltas in the asset views.
+    """
+    # maps role short names to their counter
+    ROLES = {'superadmin': 'supers', 'admin': 'admins', 'staff': 'staff'}
+
+    name = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def incr(name, by=1):
+        """Add to a counter and return its new value"""
+        return db.session.execute(
+            Counter.__table__.update().where(Counter.name == name).values(
+                value=Counter.value + by).returning(Counter.value)
+        ).scalar()
+
+    @staticmethod
+    def count(name, by=1):
+        """Add to a dashboard counter, if the dashboard reads them"""
+        if current_app.config.get('DASHBOARD_COUNTER_CACHE'):
+            Counter.incr(name, by)
+
+    @staticmethod
+    def get(name):
+        return db.session.query(Counter.value) \
+            .filter(Counter.name == name).scalar()
+
+    @staticmethod
+    def summary():
+        values = dict(db.session.query(Counter.name, Counter.value))
+        values['available'] = values['assets'] - values['assigned']
+        return values
+
+    @staticmethod
+    def rebuild():
+        """Recompute every counter from the tables"""
+        values = count_summary()
+        del values['available']
+        # the inventory version can't be recomputed, carry it over
+        values['inventory'] = Counter.get('inventory') or 0
+        Counter.query.delete()
+        db.session.add_all(Counter(name=name, value=value)
+                           for name, value in values.items())
+
+
+def count_summary():
+    """Count users per role and assets per status with aggregate queries"""
+    per_role = dict(
+        db.session.query(Role.short, db.func.count(roles.c.user_id))
+        .outerjoin(roles).group_by(Role.short)
+    )
+    summary = dict((counter, per_role.get(short, 0))
+                   for short, counter in Counter.ROLES.items())
+    summary['users'] = db.session.query(db.func.count(User.id)).scalar()
+    summary['assets'] = db.session.query(db.func.count(Asset.id)).scalar()
+    summary['assigned'] = db.session.query(db.func.count(Asset.id)) \
+        .filter(Asset.assignee_id.isnot(None)).scalar()
+    summary['available'] = summary['assets'] - summary['assigned']
+    return summary
@@ -0,0 +1,122 @@
+""" Sending of the emails queued in the outbox"""
+import json
+import smtplib
+import socket
+import time
+from datetime import datetime, timedelta
+from email.utils import formataddr
+
+from flask import current_app
+
+from app import db, mail
+from app.models import OutboxEmail
+
+# emails sent over one SMTP connection
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 8
+# seconds to wait before the first retry, doubled on each later one
+OUTBOX_RETRY_DELAY = 30
+# seconds to wait when there's nothing left to send
+OUTBOX_POLL_INTERVAL = 5
+# seconds emails are kept after they were queued once they've been sent or
+# given up on, and rows deleted per transaction when they're purged
+OUTBOX_KEEP = 30 * 24 * 3600
+OUTBOX_PURGE_BATCH_SIZE = 1000
+
+
+def deliver_due(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Send the emails that are due over a single SMTP connection, and tell
+    the senders of the ones given up on. Returns the number of emails that
+    were attempted.
+    """
+    emails = OutboxEmail.query.filter(OutboxEmail.due <= datetime.now()) \
+        .order_by(OutboxEmail.due).limit(batch_size).with_for_update().all()
+    if not emails:
+        db.session.commit()
+        return 0
+
+    done = set()
+    try:
+        with mail.connect() as connection:
+            for email in emails:
+                try:
+                    connection.send(email.message())
+                except smtplib.SMTPServerDisconnected:
+                    raise
+                except smtplib.SMTPException, e:
+                    # rejected by the server, the connection is still usable
+                    email.failed(e, OUTBOX_RETRY_DELAY, OUTBOX_MAX_ATTEMPTS)
+                else:
+                    email.delivered()
+                done.add(email.id)
+    except (smtplib.SMTPException, socket.error), e:
+        # the connection failed, retry everything that wasn't handled
+        current_app.logger.warning("Outbox SMTP connection failed: %s", e)
+        for email in emails:
+            if email.id not in done:
+                email.failed(e, OUTBOX_RETRY_DELAY, OUTBOX_MAX_ATTEMPTS)
+
+    db.session.add_all([undeliverable_notice(email) for email in emails
+                        if email.due is None and email.sent is None and
+                        email.sender not in (None, app_sender())])
+    db.session.commit()
+    return len(emails)
+
+
+def app_sender():
+    sender = current_app.config['MAIL_DEFAULT_SENDER']
+    return formataddr(sender) if isinstance(sender, tuple) else sender
+
+
+def undeliverable_notice(email):
+    """
+    The email telling the sender of an email, like the admin who sent an
+    invitation, that it was given up on. Emails the app sends on its own
+    aren't reported, so a notice that can't be delivered isn't either.
+    Those have the default sender, or none at all which means the same.
+    """
+    recipients = ', '.join(json.loads(email.recipients))
+    return OutboxEmail(
+        subject="Undeliverable: %s" % email.subject,
+        sender=current_app.config['MAIL_DEFAULT_SENDER'],
+        recipients=[email.sender],
+        body="Your email \"%s\" to %s couldn't be delivered after %d "
+             "attempts. The last error was: %s"
+             % (email.subject, recipients, email.attempts, email.error),
+        html=None
+    )
+
+
+def run_worker(poll_interval=OUTBOX_POLL_INTERVAL):
+    """Keep sending due emails until interrupted"""
+    while True:
+        try:
+            attempted = deliver_due()
+        except Exception:
+            current_app.logger.exception("Outbox delivery failed")
+            db.session.rollback()
+            attempted = 0
+        if attempted < OUTBOX_BATCH_SIZE:
+            time.sleep(poll_interval)
+
+
+def purge_done(keep=OUTBOX_KEEP, batch_size=OUTBOX_PURGE_BATCH_SIZE):
+    """
+    Delete the emails that were sent or given up on and were queued more
+    than keep seconds ago, batch_size rows per transaction. Returns the
+    number of rows deleted.
+    """
+    table = OutboxEmail.__table__
+    done = db.select([table.c.id]).where(db.and_(
+        table.c.due.is_(None),
+        table.c.created < datetime.now() - timedelta(seconds=keep),
+    )).limit(batch_size)
+    purged = 0
+    while True:
+        deleted = db.session.execute(
+            table.delete().where(table.c.id.in_(done))).rowcount
+        db.session.commit()
+        purged += deleted
+        if deleted < batch_size:
+            return purged
@@ -0,0 +1,58 @@
+""" Password hashing with a configurable method in a bounded thread pool"""
+import threading
+from multiprocessing.pool import ThreadPool
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def make_pool(size):
+    """
+    A pool of size threads. Under gevent, threads are greenlets once
+    threading is monkey patched, so gevent's own pool of real threads is
+    used instead.
+    """
+    try:
+        from gevent import monkey
+        from gevent.threadpool import ThreadPool as GeventThreadPool
+    except ImportError:
+        pass
+    else:
+        if monkey.is_module_patched('threading'):
+            return GeventThreadPool(size)
+    return ThreadPool(size)
+
+
+def run_in_pool(func, *args):
+    """
+    Run func in the hashing pool and wait for its result. PBKDF2 releases
+    the GIL, so the worker's other threads or greenlets keep serving
+    requests in the meantime, and the pool size caps how many cores
+    hashing can take.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = make_pool(current_app.config['PASSWORD_HASH_THREADS'])
+    return _pool.apply(func, args)
+
+
+def hash_password(password):
+    config = current_app.config
+    return run_in_pool(generate_password_hash, password,
+                       config['PASSWORD_HASH_METHOD'],
+                       config['PASSWORD_SALT_LENGTH'])
+
+
+def check_password(pwhash, password):
+    return run_in_pool(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """Whether a hash was made with another method than the configured one"""
+    return pwhash.split('$', 1)[0] != \
+        current_app.config['PASSWORD_HASH_METHOD']
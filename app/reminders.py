@@ -0,0 +1,90 @@
+""" Digest emails about assets that are due back soon or overdue"""
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from app import db
+from app.models import Asset, User, Role, Reminder, OutboxEmail, roles, \
+    RETURN_DATE_NEAR_DAYS
+
+
+def pending_reminders(now):
+    """
+    Find the assignments whose return date is near or past and that haven't
+    been reminded about yet, with one range query on asset.return_date
+    """
+    kind = db.case([(Asset.return_date < now, 'past')], else_='near')
+    already_sent = db.exists().where(db.and_(
+        Reminder.asset_id == Asset.id,
+        Reminder.user_id == User.id,
+        Reminder.return_date == Asset.return_date,
+        Reminder.kind == kind,
+    ))
+    return db.session.query(
+        Asset.id.label('asset_id'), Asset.name, Asset.code,
+        Asset.return_date, kind.label('kind'), User.id.label('user_id'),
+        User.name.label('user_name'), User.email.label('user_email'),
+    ).join(User, User.id == Asset.assignee_id) \
+        .filter(Asset.return_date <
+                now + timedelta(days=RETURN_DATE_NEAR_DAYS + 1),
+                Asset.lost.isnot(True), ~already_sent) \
+        .order_by(User.id, Asset.return_date).all()
+
+
+def describe(reminder):
+    return "%s (%s) %s %s" % (
+        reminder.name, reminder.code,
+        'was due back on' if reminder.kind == 'past' else 'is due back on',
+        reminder.return_date.strftime("%d, %b %Y"))
+
+
+def assignee_digest(user_email, reminders):
+    return OutboxEmail(
+        "Asset Tracker: assets due back", None, [user_email],
+        "Please return these assets assigned to you:\r\n\r\n" +
+        "\r\n".join(describe(reminder) for reminder in reminders),
+        None
+    )
+
+
+def admin_digest(admin_email, reminders):
+    lines = []
+    for user_name, items in groupby(reminders, lambda r: r.user_name):
+        lines.append("%s:" % user_name)
+        lines.extend("    %s" % describe(reminder) for reminder in items)
+    return OutboxEmail(
+        "Asset Tracker: assets due back from staff", None, [admin_email],
+        "These assigned assets are due back soon or overdue:\r\n\r\n" +
+        "\r\n".join(lines),
+        None
+    )
+
+
+def send_reminders(now=None):
+    """
+    Queue a digest for every user with assets due back soon or overdue and
+    one for every admin listing all of them, then record the reminders so
+    they aren't sent again. Returns the number of reminders sent.
+    """
+    now = now or datetime.now()
+    reminders = pending_reminders(now)
+    if not reminders:
+        return 0
+
+    emails = [assignee_digest(user_email, list(items))
+              for (_, user_email), items in groupby(
+                  reminders, lambda r: (r.user_id, r.user_email))]
+    admin_role_ids = [role.id for role in Role.registry().all()
+                      if role.short in ('admin', 'superadmin')]
+    admin_emails = db.session.query(User.email).join(roles) \
+        .filter(roles.c.role_id.in_(admin_role_ids))
+    emails.extend(admin_digest(email, reminders) for email, in admin_emails)
+
+    db.session.bulk_save_objects(emails)
+    db.session.execute(Reminder.__table__.insert(), [
+        {'asset_id': reminder.asset_id, 'user_id': reminder.user_id,
+         'return_date': reminder.return_date, 'kind': reminder.kind,
+         'sent': now}
+        for reminder in reminders
+    ])
+    db.session.commit()
+    return len(reminders)
@@ -6,17 +6,135 @@
 		})
 		.controller('AssetsController', ['$scope' ,'$http' , function ($scope, $http) {
 			$scope.assetsUrl = $('#assetsUrl').val();
+			$scope.pageSize = 50;
+			// the list is kept in local storage along with the inventory
+			// version it was read at, so later visits only fetch the changes
+			$scope.storageKey = 'assets:' + $('#userId').val() + ':' + $scope.assetsUrl;
+			$scope.loadPage = function(after) {
+				var params = {limit: $scope.pageSize};
+				if (after !== undefined) {
+					params.after = after;
+				}
+				$http({
+					method: 'GET',
+					url: $scope.assetsUrl,
+					params: params
+				}).then(function successCallback(response) {
+				    // stop paging through the full list once a search starts
+				    if ($scope.query) {
+				        return;
+				    }
+				    if (after === undefined) {
+				        $scope.version = Number(response.headers('X-Inventory-Version'));
+				    }
+				    $scope.loading = false;
+				    $scope.assets = $scope.assets.concat(response.data);
+				    // a full page means there may be more assets to fetch
+				    if (response.data.length === $scope.pageSize) {
+				        $scope.loadPage(response.data[response.data.length - 1].id);
+				    } else {
+				        $scope.saveAssets();
+				    }
+				}, function errorCallback(response) {
+				    $scope.loading = false;
+				    $scope.error = true;
+				    console.log(response);
+				});
+			}
+			$scope.syncAssets = function() {
+				$http({
+					method: 'GET',
+					url: $scope.assetsUrl,
+					params: {since: $scope.version}
+				}).then(function successCallback(response) {
+				    if ($scope.query) {
+				        return;
+				    }
+				    // the inventory went backwards, e.g. the database was
+				    // restored, so the saved list can't be patched
+				    if (response.data.version < $scope.version) {
+				        $scope.assets = [];
+				        $scope.loadPage();
+				        return;
+				    }
+				    var stale = {};
+				    response.data.removed.forEach(function(id) {
+				        stale[id] = true;
+				    });
+				    response.data.changed.forEach(function(asset) {
+				        stale[asset.id] = true;
+				    });
+				    $scope.loading = false;
+				    $scope.assets = $scope.assets.filter(function(asset) {
+				        return !stale[asset.id];
+				    }).concat(response.data.changed).sort(function(a, b) {
+				        return b.id - a.id;
+				    });
+				    $scope.version = response.data.version;
+				    $scope.saveAssets();
+				}, function errorCallback(response) {
+				    $scope.loading = false;
+				    $scope.error = true;
+				    console.log(response);
+				});
+			}
+			$scope.saveAssets = function() {
+				try {
+					localStorage.setItem($scope.storageKey, JSON.stringify({
+						version: $scope.version,
+						// near and past due flags are relative to the day
+						day: new Date().toDateString(),
+						assets: $scope.assets
+					}));
+				} catch (e) {
+					// storage is full or disabled, the list is just loaded
+					// in full next time
+				}
+			}
+			$scope.savedAssets = function() {
+				try {
+					var saved = JSON.parse(localStorage.getItem($scope.storageKey));
+					if (saved && saved.day === new Date().toDateString()) {
+						return saved;
+					}
+				} catch (e) {
+				}
+				return null;
+			}
 			$scope.loadAssets = function() {
+				var saved = $scope.savedAssets();
+				$scope.loading = true;
+				$scope.error = false;
+				$scope.hasMore = false;
+				if (saved) {
+					$scope.assets = saved.assets;
+					$scope.version = saved.version;
+					$scope.syncAssets();
+				} else {
+					$scope.assets = [];
+					$scope.loadPage();
+				}
+			}
+
+			$scope.searchUrl = $('#searchUrl').val();
+			$scope.searchPage = function(page) {
+				var query = $scope.query;
 				$scope.loading = true;
 				$scope.error = false;
-				$scope.assets = [];
 				$http({
 					method: 'GET',
-					url: $scope.assetsUrl
+					url: $scope.searchUrl,
+					params: {q: query, page: page}
 				}).then(function successCallback(response) {
+				    // ignore results for a query that has since changed
+				    if (query !== $scope.query) {
+				        return;
+				    }
 				    $scope.loading = false;
-				    $scope.assets = response.data;
-				    // console.log($scope.assets);
+				    $scope.page = response.data.page;
+				    $scope.hasMore = response.data.has_next;
+				    $scope.assets = page === 1 ? response.data.results :
+				        $scope.assets.concat(response.data.results);
 				}, function errorCallback(response) {
 				    $scope.loading = false;
 				    $scope.error = true;
@@ -24,6 +142,18 @@
 				});
 			}
 
+			$scope.$watch('query', function(query, oldQuery) {
+				if (query === oldQuery) {
+					return;
+				}
+				if (query) {
+					$scope.assets = [];
+					$scope.searchPage(1);
+				} else {
+					$scope.loadAssets();
+				}
+			});
+
 			$scope.loadAssets();
 		}]);
 
@@ -2,7 +2,8 @@ from flask import render_template, redirect, url_for, flash, request, \
     current_app
 from flask_login import login_required, current_user
 from app import csrf
-from models import User, Asset
+from app.auth import setup_complete
+from models import Counter, count_summary
 
 
 @current_app.errorhandler(404)
@@ -20,7 +21,7 @@ def csrf_error(reason):
 
 @current_app.before_request
 def before_request():
-    if not User.query.all():
+    if not setup_complete():
         # if no users in the database, the app need to be set up
         if not url_for('auth.setup') in request.path and not \
                         url_for('static', filename='') in request.path:
@@ -33,15 +34,8 @@ def before_request():
 def index():
     if not current_user.has_admin:
         return redirect(url_for('assets.mine'))
-    all_users = User.query.all()
-    all_assets = Asset.query.all()
-    summary = {
-        'users': len(all_users),
-        'admins': len([user for user in all_users if user.is_admin]),
-        'supers': len([user for user in all_users if user.is_super]),
-        'staff': len([user for user in all_users if user.is_staff]),
-        'assets': len(all_assets),
-        'assigned': len([asset for asset in all_assets if asset.is_assigned]),
-        'available': len([asset for asset in all_assets if not asset.is_assigned])
-    }
+    if current_app.config.get('DASHBOARD_COUNTER_CACHE'):
+        summary = Counter.summary()
+    else:
+        summary = count_summary()
     return render_template('index.html', summary=summary)
@@ -3,7 +3,8 @@ import os
 
 class Config(object):
     CSRF_ENABLED = True
-    SECRET_KEY = 'kSec2e+iZlgjjKChKdUY5Iw0kurzjsGX'
+    # signs sessions and the invitation and password reset links
+    SECRET_KEY = os.environ['SECRET_KEY']
     SQLALCHEMY_DATABASE_URI = os.environ['DATABASE_URL']
     SQLALCHEMY_TRACK_MODIFICATIONS = True
     MAIL_SERVER = 'smtp.mailgun.org'
@@ -11,10 +12,45 @@ class Config(object):
     MAIL_USE_TLS = True
     MAIL_USERNAME = os.environ['MAIL_USERNAME']
     MAIL_PASSWORD = os.environ['MAIL_PASSWORD']
+    # sender of the emails the app sends on its own, like reminders
+    MAIL_DEFAULT_SENDER = ('Asset Tracker', MAIL_USERNAME)
     GOOGLE_CLIENT_ID = os.environ['GOOGLE_CLIENT_ID']
     GOOGLE_WEB_CLIENT_ID = os.environ['GOOGLE_WEB_CLIENT_ID']
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)),
                                  'uploads')
+    # keep dashboard counts in the counter table and read them from there
+    # instead of counting rows. The counters aren't updated while this is
+    # off, so run manage.py rebuild_counters when turning it on
+    DASHBOARD_COUNTER_CACHE = False
+    # seconds to keep the logged in user's details in memory instead of
+    # loading them on every request. Each worker has its own cache, so keep
+    # this short. 0 disables the cache.
+    IDENTITY_CACHE_TTL = 0
+    # Werkzeug method and PBKDF2 iterations of new password hashes. Hashes
+    # made with anything else are upgraded when their user logs in. The
+    # default is the one existing hashes were made with. A higher cost is a
+    # trade against login throughput: on a 1 core box pbkdf2:sha1:1000
+    # checks about 125 logins/s and pbkdf2:sha256:50000 about 2.5, and every
+    # user's first login after a change hashes twice. Measure with
+    # manage.py password_benchmark before raising it in production
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD',
+                                          'pbkdf2:sha1:1000')
+    PASSWORD_SALT_LENGTH = 16
+    # passwords hashed at the same time by each worker process. This only
+    # limits threaded or gevent workers, a sync worker (the Procfile's
+    # default) hashes one login at a time anyway
+    PASSWORD_HASH_THREADS = 2
+    # Google's sign in certificates are cached for as long as the response
+    # allows and refreshed in the background this many seconds before then.
+    # They're kept at least GOOGLE_CERTS_MIN_TTL seconds, which should be
+    # more than the margin, when the response has no usable max-age
+    GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+    GOOGLE_CERTS_REFRESH_MARGIN = 300
+    GOOGLE_CERTS_MIN_TTL = 600
+    GOOGLE_CERTS_TIMEOUT = 10
+    # seconds that invitation and password reset links stay valid
+    INVITATION_MAX_AGE = 14 * 24 * 3600
+    PASSWORD_RESET_MAX_AGE = 24 * 3600
 
 
 class ProductionConfig(Config):
@@ -33,6 +69,16 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    # send mail to a local SMTP stand-in e.g.
+    # python -m smtpd -n -c DebuggingServer localhost:1025
+    MAIL_SERVER = 'localhost'
+    MAIL_PORT = 1025
+    MAIL_USE_TLS = False
+    MAIL_USERNAME = None
+    MAIL_PASSWORD = None
+    MAIL_DEFAULT_SENDER = 'asset-tracker@localhost'
+    # cheap hashes keep tests fast
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
 
 config = {
     'development': DevelopmentConfig,
@@ -1,14 +1,282 @@
 import os
+import sys
+import time
 from app import create_app, db
-from flask_script import Manager
+from flask_script import Manager, Command, Option
 from flask_migrate import Migrate, MigrateCommand
 
 app = create_app(os.environ.get('APP_ENV'))
 
 migrate = Migrate(app, db)
 manager = Manager(app)
+assets_manager = Manager(usage="Manage assets")
 
 manager.add_command('db', MigrateCommand)
+manager.add_command('assets', assets_manager)
+
+# matches app.assets.bulk.FORMATS, which can't be imported before create_app
+FILE_FORMATS = ('csv', 'ndjson')
+
+
+class ImportAssets(Command):
+    """Import assets from a CSV or NDJSON file"""
+    option_list = (
+        Option('path', help="file to import, - reads standard input"),
+        Option('-e', '--email', dest='email', required=True,
+               help="email of the admin the assets are added by"),
+        Option('-f', '--format', dest='file_format',
+               choices=FILE_FORMATS,
+               help="file format, guessed from the file name if not given"),
+    )
+
+    def run(self, path, email, file_format):
+        from app.models import User
+        from app.assets.bulk import import_assets, import_format
+
+        user = User.query.filter_by(email=email).first()
+        if user is None or not user.has_admin:
+            sys.exit("%s is not an admin" % email)
+
+        file_format = file_format or import_format(path)
+        if path == '-':
+            result = import_assets(sys.stdin, file_format, user)
+        else:
+            with open(path, 'rb') as stream:
+                result = import_assets(stream, file_format, user)
+
+        for number, reason in result.rejected:
+            print "Row %d rejected: %s" % (number, reason)
+        print "%d assets imported, %d rejected" % (result.imported,
+                                                    len(result.rejected))
+
+
+class ExportAssets(Command):
+    """Export every asset with its assignee and adder to a file"""
+    option_list = (
+        Option('-o', '--output', dest='path', default='-',
+               help="file to write to, standard output by default"),
+        Option('-f', '--format', dest='file_format', choices=FILE_FORMATS,
+               default='csv'),
+    )
+
+    def run(self, path, file_format):
+        from app.assets.bulk import export_rows, export_chunks
+
+        exported = [0]
+
+        def counted(rows):
+            for row in rows:
+                exported[0] += 1
+                yield row
+
+        started = time.time()
+        stream = sys.stdout if path == '-' else open(path, 'wb')
+        try:
+            for chunk in export_chunks(counted(export_rows()), file_format):
+                stream.write(chunk)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        elapsed = time.time() - started
+        sys.stderr.write("%d assets exported in %.1fs (%d rows/s)\n" % (
+            exported[0], elapsed, exported[0] / elapsed if elapsed else 0))
+
+
+class BenchmarkSerialize(Command):
+    """
+    Time serializing the newest assets the way it was done before
+    Asset.serialize_all, with the assignee queried every time it's read and
+    the adder loaded lazily, against Asset.serialize_all
+    """
+    option_list = (
+        Option('-n', '--number', dest='number', type=int, default=5000,
+               help="number of assets to serialize"),
+    )
+
+    def run(self, number):
+        from flask_login import current_user, login_user
+        from sqlalchemy import event
+        from sqlalchemy.orm import lazyload, noload
+        from app.models import Asset, User
+
+        def serialize_before(assets):
+            # Asset.assignee used to be assigned_to.first(), a query each
+            # time it was read: by is_assigned, the name, check_assignee
+            def assignee(asset):
+                return User.query.filter(User.id == asset.assignee_id).first()
+
+            return [dict(asset.serialize, **{
+                'is_assigned': assignee(asset) is not None,
+                'assignee': assignee(asset) and assignee(asset).name,
+                'is_mine': assignee(asset) is not None and
+                assignee(asset).id == current_user.id,
+                'added_by': asset.added_by.name,
+            }) for asset in assets]
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        paths = (
+            ('before', Asset.query.options(noload('assignee'),
+                                           lazyload('added_by')),
+             serialize_before),
+            ('after', Asset.query, Asset.serialize_all),
+        )
+        outputs = []
+        event.listen(db.engine, 'before_cursor_execute', count)
+        # serialize compares the assignee with the logged in user
+        with app.test_request_context():
+            login_user(User.query.first())
+            for name, query, serialize in paths:
+                # start from an empty session so nothing is loaded already
+                db.session.expunge_all()
+                del statements[:]
+                started = time.time()
+                assets = query.order_by(Asset.id.desc()).limit(number).all()
+                outputs.append(serialize(assets))
+                elapsed = time.time() - started
+                print "%s: %d assets, %d queries, %.0fms" % (
+                    name, len(assets), len(statements), elapsed * 1000)
+        event.remove(db.engine, 'before_cursor_execute', count)
+        print "output %s" % ('identical' if outputs[0] == outputs[1]
+                             else 'DIFFERS')
+
+
+assets_manager.add_command('import', ImportAssets())
+assets_manager.add_command('export', ExportAssets())
+assets_manager.add_command('benchmark', BenchmarkSerialize())
+
+
+@manager.command
+def outbox(once=False):
+    """Send queued emails, polling for new ones unless --once is given"""
+    from app.outbox import deliver_due, run_worker, OUTBOX_BATCH_SIZE
+    if once:
+        while deliver_due() == OUTBOX_BATCH_SIZE:
+            pass
+    else:
+        run_worker()
+
+
+class InviteUsers(Command):
+    """Invite everyone listed in a file, one email address per line"""
+    option_list = (
+        Option('path', help="file to read, - reads standard input"),
+        Option('-e', '--email', dest='email', required=True,
+               help="email of the admin sending the invitations"),
+        Option('-r', '--role', dest='role', default='staff',
+               choices=('admin', 'staff')),
+        Option('-u', '--url', dest='url', required=True,
+               help="base URL of the app, used in the sign up links"),
+    )
+
+    def run(self, path, email, role, url):
+        from app.models import User, Role
+        from app.auth.invitations import invite_many, split_addresses
+
+        sender = User.query.filter_by(email=email).first()
+        role = Role.registry().get(role)
+        if sender is None or sender.role.level >= role.level:
+            sys.exit("%s can't invite %s users" % (email, role.short))
+
+        stream = sys.stdin if path == '-' else open(path)
+        with stream:
+            addresses = split_addresses(stream.read())
+        with app.test_request_context(base_url=url):
+            results = invite_many(addresses, role, sender)
+        db.session.commit()
+
+        for address, error in results:
+            print "%s: %s" % (address, error or "invited")
+
+manager.add_command('invite', InviteUsers())
+
+
+@manager.option('-j', '--job', dest='names', action='append',
+                help="run only this job, once. Can be given more than once")
+def maintenance(names=None):
+    """Send emails and keep the tables small, on a schedule"""
+    import logging
+    from app.maintenance import JOBS, run_job, run_scheduler
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    if names:
+        jobs = dict((job.name, job) for job in JOBS)
+        for name in names:
+            if name not in jobs:
+                sys.exit("Unknown job %s, pick from %s"
+                         % (name, ', '.join(sorted(jobs))))
+            run_job(jobs[name])
+    else:
+        run_scheduler()
+
+
+@manager.command
+def purge_tokens():
+    """Delete used or expired invitations and password resets"""
+    from app.auth.tokens import purge_expired
+    print "%d invitations and password resets deleted" % purge_expired()
+
+
+@manager.command
+def reminders():
+    """Email reminders about assets due back soon or overdue"""
+    from app.reminders import send_reminders
+    print "%d reminders sent" % send_reminders()
+
+
+class PasswordBenchmark(Command):
+    """Measure how many password logins per second a worker can check"""
+    option_list = (
+        Option('-s', '--seconds', dest='seconds', type=float, default=5.0),
+        Option('-c', '--clients', dest='clients', type=int, default=None,
+               help="logins checked at the same time, twice the number of "
+                    "hashing threads by default"),
+    )
+
+    def run(self, seconds, clients):
+        import threading
+        from multiprocessing import cpu_count
+        from app.passwords import hash_password, check_password
+
+        threads = app.config['PASSWORD_HASH_THREADS']
+        clients = clients or threads * 2
+        pwhash = hash_password('benchmark')
+        checked = [0]
+        lock = threading.Lock()
+        deadline = time.time() + seconds
+
+        def login():
+            with app.app_context():
+                while time.time() < deadline:
+                    check_password(pwhash, 'benchmark')
+                    with lock:
+                        checked[0] += 1
+
+        started = time.time()
+        workers = [threading.Thread(target=login) for _ in range(clients)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        rate = checked[0] / (time.time() - started)
+        cores = min(threads, cpu_count())
+        print "%s, %d hashing threads, %d clients" % (
+            app.config['PASSWORD_HASH_METHOD'], threads, clients)
+        print "%.1f logins/s, %.1f logins/s per core" % (rate, rate / cores)
+
+manager.add_command('password_benchmark', PasswordBenchmark())
+
+
+@manager.command
+def rebuild_counters():
+    """Recompute the cached dashboard counters from the tables"""
+    from app.models import Counter
+    Counter.rebuild()
+    db.session.commit()
 
 if __name__ == '__main__':
     manager.run()
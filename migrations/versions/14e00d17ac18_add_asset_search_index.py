@@ -0,0 +1,36 @@
+"""Add asset search index
+
+Revision ID: 14e00d17ac18
+Revises: a74ccccfb63e
+Create Date: 2026-10-18 10:03:27.905000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '14e00d17ac18'
+down_revision = 'a74ccccfb63e'
+
+from alembic import op
+import sqlalchemy as sa
+
+# must be kept identical to ASSET_SEARCH_VECTOR in app/models.py, otherwise
+# searches won't use the index
+ASSET_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', "
+    "coalesce(asset.name, '') || ' ' || "
+    "coalesce(asset.code, '') || ' ' || "
+    "coalesce(asset.serial_no, '') || ' ' || "
+    "regexp_replace(coalesce(asset.code, '') || ' ' || "
+    "coalesce(asset.serial_no, ''), '\\W+', ' ', 'g')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(asset.type, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(asset.description, '')), 'C')"
+)
+
+
+def upgrade():
+    op.execute("CREATE INDEX ix_asset_search ON asset USING gin ((%s))"
+               % ASSET_SEARCH_VECTOR)
+
+
+def downgrade():
+    op.execute("DROP INDEX ix_asset_search")
@@ -0,0 +1,47 @@
+"""Add foreign key indexes
+
+Revision ID: 5651bca7b55b
+Revises: d7100256a8c1
+Create Date: 2026-10-18 13:35:48.160000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5651bca7b55b'
+down_revision = 'd7100256a8c1'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # an asset can only have one assignee. Assignment rows carry no date, so
+    # there's no telling which of several is current: stop and let someone
+    # fix them by hand rather than guess
+    duplicated = [asset_id for asset_id, in op.get_bind().execute(
+        "SELECT asset_id FROM assignment GROUP BY asset_id "
+        "HAVING count(*) > 1 ORDER BY asset_id")]
+    if duplicated:
+        raise RuntimeError(
+            "Assets assigned more than once, keep one assignment row for "
+            "each and upgrade again: %s" % ', '.join(map(str, duplicated)))
+    op.create_index(op.f('ix_assignment_asset_id'), 'assignment', ['asset_id'], unique=True)
+    op.create_index(op.f('ix_assignment_user_id'), 'assignment', ['user_id'], unique=False)
+    op.create_index(op.f('ix_roles_user_id'), 'roles', ['user_id'], unique=False)
+    op.create_index(op.f('ix_asset_added_by_id'), 'asset', ['added_by_id'], unique=False)
+    op.create_index('ix_asset_lost', 'asset', ['lost'], unique=False,
+                    postgresql_where=sa.text('lost'))
+    op.create_index(op.f('ix_google_user_user_id'), 'google_user', ['user_id'], unique=False)
+    op.create_index(op.f('ix_invitation_sender_id'), 'invitation', ['sender_id'], unique=False)
+    op.create_index(op.f('ix_password_reset_request_user_id'), 'password_reset_request', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_password_reset_request_user_id'), table_name='password_reset_request')
+    op.drop_index(op.f('ix_invitation_sender_id'), table_name='invitation')
+    op.drop_index(op.f('ix_google_user_user_id'), table_name='google_user')
+    op.drop_index('ix_asset_lost', table_name='asset')
+    op.drop_index(op.f('ix_asset_added_by_id'), table_name='asset')
+    op.drop_index(op.f('ix_roles_user_id'), table_name='roles')
+    op.drop_index(op.f('ix_assignment_user_id'), table_name='assignment')
+    op.drop_index(op.f('ix_assignment_asset_id'), table_name='assignment')
@@ -0,0 +1,29 @@
+"""Add asset version column
+
+Revision ID: 7b650a5091d2
+Revises: 9432f6fede35
+Create Date: 2026-10-18 16:07:52.881000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '7b650a5091d2'
+down_revision = '9432f6fede35'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # existing assets start at version 0. Adding a column with a constant
+    # default doesn't rewrite the table, the default is dropped afterwards
+    # as new values come from the inventory counter
+    op.add_column('asset', sa.Column('version', sa.Integer(), nullable=False,
+                                     server_default='0'))
+    op.alter_column('asset', 'version', server_default=None)
+    op.create_index(op.f('ix_asset_version'), 'asset', ['version'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_asset_version'), table_name='asset')
+    op.drop_column('asset', 'version')
@@ -0,0 +1,34 @@
+"""Drop the assignment table
+
+Revision ID: 9263b704cc05
+Revises: ca6754a8a51e
+Create Date: 2026-10-18 21:40:52.318000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9263b704cc05'
+down_revision = 'ca6754a8a51e'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # replaced by asset.assignee_id and the assignment history in
+    # 5ea7816ba950, which left it in place so it could be downgraded
+    op.drop_table('assignment')
+
+
+def downgrade():
+    op.create_table('assignment',
+    sa.Column('asset_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['asset_id'], ['asset.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], )
+    )
+    op.execute("INSERT INTO assignment (asset_id, user_id) "
+               "SELECT id, assignee_id FROM asset "
+               "WHERE assignee_id IS NOT NULL")
+    op.create_index(op.f('ix_assignment_user_id'), 'assignment', ['user_id'], unique=False)
+    op.create_index(op.f('ix_assignment_asset_id'), 'assignment', ['asset_id'], unique=True)
@@ -0,0 +1,22 @@
+"""Add inventory version counter
+
+Revision ID: 9432f6fede35
+Revises: 7cbb6e54e64b
+Create Date: 2026-10-18 15:31:26.402000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '9432f6fede35'
+down_revision = '7cbb6e54e64b'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.execute("INSERT INTO counter (name, value) VALUES ('inventory', 0)")
+
+
+def downgrade():
+    op.execute("DELETE FROM counter WHERE name = 'inventory'")
@@ -0,0 +1,34 @@
+"""Add user directory indexes
+
+Revision ID: a13e0ba22ba5
+Revises: ead6c73e9a2a
+Create Date: 2026-10-18 17:26:44.208000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a13e0ba22ba5'
+down_revision = 'ead6c73e9a2a'
+
+from alembic import op
+import sqlalchemy as sa
+
+# must be kept identical to USER_SEARCH_VECTOR in app/models.py, otherwise
+# searches won't use the index
+USER_SEARCH_VECTOR = (
+    "to_tsvector('simple', "
+    "coalesce(\"user\".name, '') || ' ' || "
+    "coalesce(\"user\".email, '') || ' ' || "
+    "regexp_replace(coalesce(\"user\".email, ''), '\\W+', ' ', 'g'))"
+)
+
+
+def upgrade():
+    op.create_index('ix_user_name_id', 'user', ['name', 'id'], unique=False)
+    op.execute('CREATE INDEX ix_user_search ON "user" USING gin ((%s))'
+               % USER_SEARCH_VECTOR)
+
+
+def downgrade():
+    op.execute("DROP INDEX ix_user_search")
+    op.drop_index('ix_user_name_id', table_name='user')
@@ -0,0 +1,47 @@
+"""Create counter table
+
+Revision ID: a74ccccfb63e
+Revises: 5097707a89e5
+Create Date: 2026-10-18 09:12:41.318000
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a74ccccfb63e'
+down_revision = '5097707a89e5'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    counter = op.create_table('counter',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # seed the counters from the existing rows
+    conn = op.get_bind()
+
+    def count(sql):
+        return conn.execute(sa.text(sql)).scalar()
+
+    def count_role(short):
+        return count("SELECT count(roles.user_id) FROM roles "
+                     "JOIN role ON role.id = roles.role_id "
+                     "WHERE role.short = '%s'" % short)
+
+    op.bulk_insert(counter, [
+        {'name': 'users', 'value': count('SELECT count(*) FROM "user"')},
+        {'name': 'supers', 'value': count_role('superadmin')},
+        {'name': 'admins', 'value': count_role('admin')},
+        {'name': 'staff', 'value': count_role('staff')},
+        {'name': 'assets', 'value': count('SELECT count(*) FROM asset')},
+        {'name': 'assigned', 'value': count(
+            'SELECT count(DISTINCT asset_id) FROM assignment')},
+    ])
+
+
+def downgrade():
+    op.drop_table('counter')
@@ -0,0 +1,12 @@
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+# config.py reads these when it's imported, so they're set before any test
+# module imports the app
+if TEST_DATABASE_URL:
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+for name in ('DATABASE_URL', 'SECRET_KEY', 'MAIL_USERNAME', 'MAIL_PASSWORD',
+             'GOOGLE_CLIENT_ID', 'GOOGLE_WEB_CLIENT_ID'):
+    os.environ.setdefault(name, 'test')
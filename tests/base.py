@@ -0,0 +1,103 @@
+""" Shared set up of the test cases
+
+The tests need a Postgres database they're free to wipe, given as
+TEST_DATABASE_URL. Every test case starts from an empty schema brought up to
+date by the migrations, so the indexes they create are the ones tested.
+"""
+import os
+import unittest
+from contextlib import contextmanager
+
+from flask_migrate import Migrate, upgrade
+from sqlalchemy import event
+
+from app import create_app, db
+from app.models import User
+from tests import ROOT, TEST_DATABASE_URL
+
+PASSWORD = 'password'
+
+# views are registered when the first app is created, so all the tests share
+# one app
+_app = None
+
+
+def get_app():
+    global _app
+    if _app is None:
+        _app = create_app('testing')
+        _app.config['WTF_CSRF_ENABLED'] = False
+        _app.config['MAIL_SUPPRESS_SEND'] = True
+        Migrate(_app, db, directory=os.path.join(ROOT, 'migrations'))
+    return _app
+
+
+def reset_database():
+    """Drop everything and run the migrations on an empty schema"""
+    import app.auth
+    from app.models import Role
+
+    db.session.remove()
+    db.engine.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+    db.engine.dispose()
+    upgrade(directory=os.path.join(ROOT, 'migrations'))
+    # forget what the process cached about the old database
+    Role.invalidate_registry()
+    app.auth._setup_complete = False
+    app.auth._identities.clear()
+
+
+class AppTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        if not TEST_DATABASE_URL:
+            raise unittest.SkipTest("TEST_DATABASE_URL isn't set")
+        cls.app = get_app()
+        cls.context = cls.app.test_request_context()
+        cls.context.push()
+        reset_database()
+        cls.seed()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        cls.context.pop()
+
+    @classmethod
+    def seed(cls):
+        """Add the rows the tests of the case share"""
+
+    def tearDown(self):
+        db.session.rollback()
+
+    @staticmethod
+    def add_user(email, role_short='staff', name=None):
+        user = User(email, PASSWORD, name or email.split('@')[0], role_short)
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def client_for(self, user):
+        """A test client logged in as user"""
+        client = self.app.test_client()
+        response = client.post('/login', data={'email': user.email,
+                                               'password': PASSWORD})
+        self.assertEqual(response.status_code, 302)
+        return client
+
+    @contextmanager
+    def count_queries(self):
+        """Collect the statements run inside the block into a list"""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters,
+                                  context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute',
+                     before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute',
+                         before_cursor_execute)
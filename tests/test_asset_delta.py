@@ -0,0 +1,36 @@
+import json
+from datetime import datetime
+
+from app import db
+from app.models import Asset, Counter, User
+
+from tests.base import AppTestCase
+
+
+class AssetDeltaTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        admin = cls.add_user('admin@example.com', 'admin')
+        for email in ('mine@example.com', 'other@example.com'):
+            user = cls.add_user(email)
+            for number in range(2):
+                code = '%s%d' % (email[0], number)
+                asset = Asset(code, 'Laptop', '', code, code,
+                              datetime(2016, 1, 1), admin)
+                asset.assign(user, datetime(2030, 1, 1))
+                db.session.add(asset)
+        db.session.commit()
+
+    def test_removed_only_lists_assets_the_client_could_have(self):
+        since = Counter.get('inventory')
+        for code in ('m0', 'o0'):
+            Asset.query.filter_by(code=code).first().reclaim()
+        db.session.commit()
+
+        response = self.client_for(
+            User.query.filter_by(email='mine@example.com').first()
+        ).get('/assets/assigned_to_me?accept=json&since=%d' % since)
+        delta = json.loads(response.data)
+        self.assertEqual(delta['changed'], [])
+        self.assertEqual(delta['removed'],
+                         [Asset.query.filter_by(code='m0').first().id])
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from app import db
+from app.models import Asset, User
+
+from tests.base import AppTestCase
+
+LIST_URL = '/assets/admin/?accept=json'
+
+
+class AssetListETagTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        admin = cls.add_user('admin@example.com', 'admin')
+        cls.add_user('staff@example.com')
+        for number in range(3):
+            db.session.add(Asset('Asset %d' % number, 'Laptop', '',
+                                 'S%d' % number, 'C%d' % number,
+                                 datetime(2016, 1, 1), admin))
+        db.session.commit()
+
+    def setUp(self):
+        self.admin = self.client_for(
+            User.query.filter_by(email='admin@example.com').first())
+        self.staff_user = User.query.filter_by(
+            email='staff@example.com').first()
+        self.staff = self.client_for(self.staff_user)
+
+    def etag(self, client, url=LIST_URL):
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.headers['ETag']
+
+    def assertChanged(self, client, etag, url=LIST_URL):
+        response = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def asset(self, code):
+        return Asset.query.filter_by(code=code).first()
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.etag(self.admin)
+        response = self.admin.get(LIST_URL, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, '')
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_editing_an_asset_changes_the_etag(self):
+        etag = self.etag(self.admin)
+        response = self.admin.post('/assets/%d/edit' % self.asset('C0').id,
+                                   data={'name': 'Renamed', 'type': 'Laptop',
+                                         'description': '',
+                                         'serial_no': 'S0', 'code': 'C0',
+                                         'purchased': '01/01/2016'})
+        self.assertEqual(response.status_code, 302)
+        self.assertChanged(self.admin, etag)
+
+    def test_assigning_and_losing_an_asset_changes_the_etag(self):
+        mine = '/assets/assigned_to_me?accept=json'
+        admin_etag = self.etag(self.admin)
+        staff_etag = self.etag(self.staff, mine)
+        asset_id = self.asset('C1').id
+        response = self.admin.post('/assets/%d/assign' % asset_id, data={
+            'user': self.staff_user.id, 'return_date': '01/01/2030'})
+        self.assertEqual(response.status_code, 302)
+        self.assertChanged(self.admin, admin_etag)
+        self.assertChanged(self.staff, staff_etag, mine)
+
+        admin_etag = self.etag(self.admin)
+        staff_etag = self.etag(self.staff, mine)
+        response = self.staff.post('/assets/%d/report/lost' % asset_id)
+        self.assertEqual(response.status_code, 302)
+        self.assertChanged(self.admin, admin_etag)
+        self.assertChanged(self.staff, staff_etag, mine)
@@ -0,0 +1,25 @@
+import json
+
+from app.models import Asset, User
+
+from tests.base import AppTestCase
+
+
+class AssetEventTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        cls.add_user('admin@example.com', 'admin', 'Admin')
+
+    def test_adding_an_asset_starts_its_timeline(self):
+        client = self.client_for(
+            User.query.filter_by(email='admin@example.com').first())
+        response = client.post('/assets/add', data={
+            'name': 'Laptop', 'type': 'Computer', 'description': '',
+            'serial_no': 'S1', 'code': 'ADD1', 'purchased': '01/02/2016'})
+        self.assertEqual(response.status_code, 302)
+
+        asset = Asset.query.filter_by(code='ADD1').first()
+        events = json.loads(
+            client.get('/assets/%d/timeline' % asset.id).data)['results']
+        self.assertEqual([(event['kind'], event['actor'])
+                          for event in events], [('add', 'Admin')])
@@ -0,0 +1,115 @@
+import json
+import re
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Asset, User
+
+from tests.base import AppTestCase
+
+# the logged in user, the inventory version and the assets
+MAX_LIST_QUERIES = 3
+
+
+class AssetFilterTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        admin = cls.add_user('admin@example.com', 'admin')
+        staff = cls.add_user('staff@example.com')
+        cls.add_assets(admin, staff, 0, 30)
+
+    @staticmethod
+    def add_assets(admin, staff, start, end):
+        """Assign every third asset and mark every fifth lost"""
+        for number in range(start, end):
+            asset = Asset('Asset %d' % number, 'Laptop', '', 'S%d' % number,
+                          'C%d' % number, datetime(2016, 1, 1), admin)
+            db.session.add(asset)
+            if number % 3 == 0:
+                asset.assign(staff, datetime.now() + timedelta(days=30))
+            asset.lost = number % 5 == 0
+        db.session.commit()
+
+    def fetch(self, client, filter_by):
+        with self.count_queries() as statements:
+            response = client.get('/assets/admin/%s?accept=json' % filter_by)
+            self.assertEqual(response.status_code, 200)
+            assets = json.loads(response.data)
+        return assets, len(statements)
+
+    def expected(self, filter_by):
+        assets = Asset.query.all()
+        if filter_by == 'assigned':
+            assets = [asset for asset in assets if asset.is_assigned]
+        elif filter_by == 'available':
+            assets = [asset for asset in assets
+                      if not asset.is_assigned and not asset.lost]
+        elif filter_by == 'lost':
+            assets = [asset for asset in assets if asset.lost]
+        return sorted((asset.id for asset in assets), reverse=True)
+
+    def test_filters_match_and_query_count_is_bounded(self):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        staff = User.query.filter_by(email='staff@example.com').first()
+        client = self.client_for(admin)
+
+        counts = {}
+        for filter_by in ('', 'assigned', 'available', 'lost'):
+            assets, queries = self.fetch(client, filter_by)
+            self.assertEqual([asset['id'] for asset in assets],
+                             self.expected(filter_by))
+            self.assertLessEqual(queries, MAX_LIST_QUERIES, filter_by)
+            counts[filter_by] = queries
+
+        # more assets mean more rows, not more queries
+        self.add_assets(admin, staff, 30, 90)
+        for filter_by, queries in counts.items():
+            assets, more_queries = self.fetch(client, filter_by)
+            self.assertEqual(len(assets), len(self.expected(filter_by)))
+            self.assertEqual(more_queries, queries, filter_by)
+
+    def test_page_size_is_clamped(self):
+        from app.assets import views
+        admin = User.query.filter_by(email='admin@example.com').first()
+        client = self.client_for(admin)
+        max_page_size = views.MAX_PAGE_SIZE
+        views.MAX_PAGE_SIZE = 5
+        try:
+            for limit in ('', '&limit=0', '&limit=-3', '&limit=100000'):
+                response = client.get('/assets/admin/?accept=json' + limit)
+                count = len(json.loads(response.data))
+                self.assertEqual(count, 1 if limit in ('&limit=0',
+                                                      '&limit=-3') else 5)
+                response = client.get('/assets/search?q=asset' + limit)
+                self.assertLessEqual(
+                    len(json.loads(response.data)['results']), 5)
+        finally:
+            views.MAX_PAGE_SIZE = max_page_size
+
+    def search_url(self, client, page):
+        """The search url a list page hands to its script"""
+        html = client.get(page).data
+        return re.search(r'id="searchUrl"[^>]* value="([^"]*)"',
+                         html).group(1).replace('&amp;', '&')
+
+    def search(self, client, page):
+        url = self.search_url(client, page)
+        response = client.get(url + ('&' if '?' in url else '?') +
+                              'q=asset&limit=500')
+        return sorted((asset['id'] for asset in
+                       json.loads(response.data)['results']), reverse=True)
+
+    def test_search_stays_within_the_page_list(self):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        staff = User.query.filter_by(email='staff@example.com').first()
+        client = self.client_for(admin)
+        self.assertEqual(self.search(client, '/assets/assigned_to_me'), [])
+        for filter_by in ('', 'assigned', 'lost'):
+            self.assertEqual(
+                self.search(client, '/assets/admin/%s' % filter_by),
+                self.expected(filter_by))
+
+        self.assertEqual(
+            self.search(self.client_for(staff), '/assets/assigned_to_me'),
+            sorted((asset.id for asset in staff.assets_assigned),
+                   reverse=True))
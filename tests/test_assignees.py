@@ -0,0 +1,58 @@
+import json
+from datetime import datetime
+
+from app import db
+from app.assets.views import ASSIGNEES_LIMIT
+from app.models import Asset, User
+
+from tests.base import AppTestCase
+
+
+class AssigneeTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        admin = cls.add_user('alice.admin@example.com', 'admin', 'Alice Admin')
+        cls.add_user('alice@example.com', name='Alice Staff')
+        cls.add_user('alicia@example.com', name='Alicia Other')
+        cls.add_user('bob@example.com', name='Bob Builder')
+        for number in range(ASSIGNEES_LIMIT + 2):
+            cls.add_user('member%02d@example.com' % number,
+                         name='Member %02d' % number)
+        db.session.add(Asset('Laptop', 'Laptop', '', 'S1', 'C1',
+                             datetime(2016, 1, 1), admin))
+        db.session.commit()
+
+    def setUp(self):
+        self.admin = User.query.filter_by(
+            email='alice.admin@example.com').first()
+        self.asset = Asset.query.filter_by(code='C1').first()
+
+    def lookup(self, q):
+        response = self.client_for(self.admin).get('/assets/assignees?q=' + q)
+        self.assertEqual(response.status_code, 200)
+        return [user['name'] for user in json.loads(response.data)['results']]
+
+    def test_typeahead_returns_only_staff_matches(self):
+        self.assertEqual(self.lookup('ali'), ['Alice Staff', 'Alicia Other'])
+        self.assertEqual(self.lookup('alice.admin'), [])
+        self.assertEqual(self.lookup('bob@'), ['Bob Builder'])
+        self.assertEqual(len(self.lookup('member')), ASSIGNEES_LIMIT)
+
+    def assign(self, user_id):
+        return self.client_for(self.admin).post(
+            '/assets/%d/assign' % self.asset.id,
+            data={'user': user_id, 'return_date': '01/02/2030'})
+
+    def test_assign_rejects_users_who_arent_staff(self):
+        for user_id in (self.admin.id, 10 ** 6):
+            response = self.assign(user_id)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Assets can only be assigned to staff members',
+                          response.data)
+            db.session.expire_all()
+            self.assertIsNone(Asset.query.get(self.asset.id).assignee_id)
+
+        staff = User.query.filter_by(email='bob@example.com').first()
+        self.assertEqual(self.assign(staff.id).status_code, 302)
+        db.session.expire_all()
+        self.assertEqual(Asset.query.get(self.asset.id).assignee_id, staff.id)
@@ -0,0 +1,73 @@
+import os
+from datetime import datetime
+
+from flask_migrate import downgrade, upgrade
+
+from app import db
+from app.models import Asset, AssignmentHistory, User
+
+from tests import ROOT
+from tests.base import AppTestCase
+
+MIGRATIONS = os.path.join(ROOT, 'migrations')
+
+
+class AssignmentHistoryTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        admin = cls.add_user('admin@example.com', 'admin')
+        cls.add_user('staff@example.com')
+        db.session.add(Asset('Laptop', 'Laptop', '', 'S1', 'C1',
+                             datetime(2016, 1, 1), admin))
+        db.session.commit()
+
+    def test_assign_then_reclaim_writes_one_history_row(self):
+        client = self.client_for(
+            User.query.filter_by(email='admin@example.com').first())
+        staff = User.query.filter_by(email='staff@example.com').first()
+        asset_id = Asset.query.filter_by(code='C1').first().id
+
+        response = client.post('/assets/%d/assign' % asset_id, data={
+            'user': staff.id, 'return_date': '01/01/2030'})
+        self.assertEqual(response.status_code, 302)
+        response = client.post('/assets/%d/reclaim' % asset_id)
+        self.assertEqual(response.status_code, 302)
+
+        db.session.expire_all()
+        self.assertIsNone(Asset.query.get(asset_id).assignee_id)
+        rows = AssignmentHistory.query.filter_by(asset_id=asset_id).all()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].user_id, staff.id)
+        self.assertIsNotNone(rows[0].assigned_at)
+        self.assertIsNotNone(rows[0].returned_at)
+        self.assertLessEqual(rows[0].assigned_at, rows[0].returned_at)
+
+        # reclaiming it again is refused instead of failing
+        response = client.post('/assets/%d/reclaim' % asset_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("isn't assigned", response.data)
+        self.assertEqual(
+            AssignmentHistory.query.filter_by(asset_id=asset_id).count(), 1)
+
+
+class AssigneeMigrationTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        cls.add_user('staff@example.com')
+
+    def test_assignments_are_moved_to_the_asset_and_history(self):
+        staff_id = User.query.filter_by(email='staff@example.com').first().id
+        db.session.remove()
+        downgrade(directory=MIGRATIONS, revision='5651bca7b55b')
+        db.engine.execute("INSERT INTO asset (name) VALUES ('a'), ('b')")
+        db.engine.execute(
+            "INSERT INTO assignment (asset_id, user_id) "
+            "SELECT id, %s FROM asset WHERE name = 'a'", staff_id)
+        upgrade(directory=MIGRATIONS)
+
+        assets = dict(db.session.query(Asset.name, Asset.assignee_id))
+        self.assertEqual(assets, {'a': staff_id, 'b': None})
+        rows = AssignmentHistory.query.all()
+        self.assertEqual([(row.user_id, row.assigned_at, row.returned_at)
+                          for row in rows], [(staff_id, None, None)])
+        self.assertEqual(rows[0].asset.name, 'a')
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from PIL import Image
+
+import app.account.avatars
+from app.account.avatars import save_avatar, avatar_filename, AVATAR_SIZES
+from app.account.views import PROFILE_PIC_CACHE_SECONDS
+from app.models import User
+
+from tests.base import AppTestCase
+
+
+def picture(size=(120, 80), mode='RGBA', image_format='PNG'):
+    stream = StringIO()
+    Image.new(mode, size, (200, 30, 30, 128)).save(stream, image_format)
+    stream.seek(0)
+    return stream
+
+
+class AvatarTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        cls.add_user('staff@example.com')
+
+    def setUp(self):
+        self.saved = self.app.config['UPLOAD_FOLDER']
+        self.max_bytes = app.account.avatars.AVATAR_MAX_BYTES
+        self.upload_folder = tempfile.mkdtemp()
+        self.app.config['UPLOAD_FOLDER'] = self.upload_folder
+        self.folder = os.path.join(self.upload_folder, 'avatars')
+
+    def tearDown(self):
+        super(AvatarTestCase, self).tearDown()
+        self.app.config['UPLOAD_FOLDER'] = self.saved
+        app.account.avatars.AVATAR_MAX_BYTES = self.max_bytes
+        shutil.rmtree(self.upload_folder)
+
+    def test_thumbnails_are_square_jpegs_of_each_size(self):
+        digest = save_avatar(picture(), self.folder)
+        self.assertEqual(sorted(os.listdir(self.folder)), sorted(
+            avatar_filename(digest, size) for size in AVATAR_SIZES))
+        for size in AVATAR_SIZES:
+            image = Image.open(os.path.join(self.folder,
+                                            avatar_filename(digest, size)))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (size, size))
+
+    def test_the_same_picture_reuses_its_thumbnails(self):
+        digest = save_avatar(picture(), self.folder)
+        path = os.path.join(self.folder, avatar_filename(digest, 36))
+        os.utime(path, (0, 0))
+        self.assertEqual(save_avatar(picture(), self.folder), digest)
+        self.assertEqual(os.path.getmtime(path), 0)
+        self.assertEqual(len(os.listdir(self.folder)), len(AVATAR_SIZES))
+
+        other = save_avatar(picture(size=(90, 90)), self.folder)
+        self.assertNotEqual(other, digest)
+        self.assertEqual(len(os.listdir(self.folder)),
+                         2 * len(AVATAR_SIZES))
+
+    def test_oversized_uploads_are_rejected(self):
+        app.account.avatars.AVATAR_MAX_BYTES = 100
+        with self.assertRaises(ValueError):
+            save_avatar(picture(), self.folder)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_files_that_arent_pictures_are_rejected(self):
+        with self.assertRaises(ValueError):
+            save_avatar(StringIO('not a picture'), self.folder)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_uploaded_thumbnails_are_cached_for_good(self):
+        user = User.query.filter_by(email='staff@example.com').first()
+        client = self.client_for(user)
+        response = client.post('/account/edit', data={
+            'name': 'Staff', 'email': user.email,
+            'profile_pic': (picture(), 'me.png')})
+        self.assertEqual(response.status_code, 302)
+        digest = User.query.get(user.id).avatar
+        self.assertEqual(digest, save_avatar(picture(), self.folder))
+
+        response = client.get('/profile_pic/' + avatar_filename(digest, 36))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Cache-Control'],
+                         'private, max-age=%d, immutable'
+                         % PROFILE_PIC_CACHE_SECONDS)
+
+    def test_edit_keeps_the_old_picture_when_one_is_rejected(self):
+        user = User.query.filter_by(email='staff@example.com').first()
+        response = self.client_for(user).post('/account/edit', data={
+            'name': 'Staff', 'email': user.email,
+            'profile_pic': (StringIO('not a picture'), 'me.png')})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(User.query.get(user.id).avatar)
+        self.assertEqual(os.listdir(self.folder), [])
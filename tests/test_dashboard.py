@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from app import db
+from app.models import Asset, Counter, User, count_summary
+
+from tests.base import AppTestCase
+
+
+class DashboardCounterTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        cls.add_user('super@example.com', 'superadmin')
+
+    def tearDown(self):
+        super(DashboardCounterTestCase, self).tearDown()
+        self.app.config['DASHBOARD_COUNTER_CACHE'] = False
+
+    def add_and_assign(self, number):
+        admin = User.query.filter_by(email='super@example.com').first()
+        staff = self.add_user('staff%d@example.com' % number)
+        asset = Asset('Asset %d' % number, 'Laptop', '', 'S%d' % number,
+                      'C%d' % number, datetime(2016, 1, 1), admin)
+        asset.assign(staff, datetime(2030, 1, 1))
+        db.session.add(asset)
+        db.session.commit()
+        return asset
+
+    def counters(self):
+        values = Counter.summary()
+        del values['inventory']
+        return values
+
+    def test_counters_untouched_while_cache_is_off(self):
+        before = self.counters()
+        self.add_and_assign(1)
+        self.assertEqual(self.counters(), before)
+
+    def test_counters_follow_changes_while_cache_is_on(self):
+        self.app.config['DASHBOARD_COUNTER_CACHE'] = True
+        Counter.rebuild()
+        db.session.commit()
+
+        asset = self.add_and_assign(2)
+        self.add_and_assign(3)
+        asset.reclaim()
+        db.session.commit()
+        self.assertEqual(self.counters(), count_summary())
+
+        response = self.client_for(
+            User.query.filter_by(email='super@example.com').first()).get('/')
+        self.assertEqual(response.status_code, 200)
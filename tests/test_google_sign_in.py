@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from oauth2client import crypt
+
+import app.auth.google
+from app.auth.google import get_certs
+from app.models import GoogleUser
+
+from tests import ROOT
+from tests.base import AppTestCase
+
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return f.read()
+
+
+class CertsHandler(BaseHTTPRequestHandler):
+    """Serves the test certificate the way Google serves its own"""
+    status = 200
+    cache_control = 'public, max-age=3600'
+    requests = 0
+
+    def do_GET(self):
+        CertsHandler.requests += 1
+        body = json.dumps({'test': fixture('google_cert.pem')})
+        self.send_response(self.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.cache_control:
+            self.send_header('Cache-Control', self.cache_control)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class GoogleSignInTestCase(AppTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(GoogleSignInTestCase, cls).setUpClass()
+        cls.server = HTTPServer(('127.0.0.1', 0), CertsHandler)
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(GoogleSignInTestCase, cls).tearDownClass()
+
+    @classmethod
+    def seed(cls):
+        cls.add_user('admin@example.com', 'admin')
+
+    def setUp(self):
+        config = self.app.config
+        self.saved = dict((name, config[name]) for name in (
+            'GOOGLE_CERTS_URL', 'GOOGLE_WEB_CLIENT_ID'))
+        config['GOOGLE_CERTS_URL'] = 'http://127.0.0.1:%d/certs' % \
+            self.server.server_port
+        config['GOOGLE_WEB_CLIENT_ID'] = config['GOOGLE_CLIENT_ID']
+        CertsHandler.status = 200
+        CertsHandler.cache_control = 'public, max-age=3600'
+        CertsHandler.requests = 0
+        app.auth.google._certs = None
+
+    def tearDown(self):
+        super(GoogleSignInTestCase, self).tearDown()
+        self.app.config.update(self.saved)
+        app.auth.google._certs = None
+
+    def id_token(self, google_id, email):
+        now = int(time.time())
+        return crypt.make_signed_jwt(
+            crypt.Signer.from_string(fixture('google_key.pem')), {
+                'iss': 'accounts.google.com',
+                'aud': self.app.config['GOOGLE_CLIENT_ID'],
+                'iat': now, 'exp': now + 3600,
+                'sub': google_id, 'email': email, 'name': 'Google User'})
+
+    def sign_in(self, id_token):
+        return self.app.test_client().post('/oauth/google',
+                                           data={'id_token': id_token})
+
+    def test_sign_in_fetches_the_certificates_once(self):
+        for _ in range(2):
+            response = self.sign_in(self.id_token('1', 'g1@example.com'))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('redirect', json.loads(response.data))
+        self.assertEqual(GoogleUser.query.filter_by(google_id='1').count(),
+                         1)
+        self.assertEqual(CertsHandler.requests, 1)
+
+    def test_certificates_without_max_age_are_kept_for_the_minimum(self):
+        CertsHandler.cache_control = 'no-cache'
+        get_certs()
+        get_certs()
+        self.assertEqual(CertsHandler.requests, 1)
+        self.assertGreater(app.auth.google._certs[1], time.time() +
+                           self.app.config['GOOGLE_CERTS_MIN_TTL'] - 10)
+
+    def test_unreachable_certificates_fail_the_sign_in(self):
+        CertsHandler.status = 500
+        response = self.sign_in(self.id_token('2', 'g2@example.com'))
+        self.assertEqual(response.status_code, 503)
+        self.assertIsNone(GoogleUser.query.filter_by(google_id='2').first())
+
+    def test_tokens_signed_by_someone_else_are_rejected(self):
+        token = self.id_token('3', 'g3@example.com')
+        header, payload, signature = token.split('.')
+        response = self.sign_in('.'.join([header, payload, signature[::-1]]))
+        self.assertEqual(response.status_code, 400)
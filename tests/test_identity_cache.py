@@ -0,0 +1,54 @@
+import re
+
+import app.auth
+from app import db
+from app.auth import load_identity
+from app.models import OutboxEmail, User
+
+from tests.base import AppTestCase, PASSWORD
+
+
+class IdentityCacheTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        cls.add_user('staff@example.com')
+        cls.add_user('reset@example.com')
+
+    def setUp(self):
+        self.app.config['IDENTITY_CACHE_TTL'] = 60
+        self.user_id = User.query.filter_by(
+            email='staff@example.com').first().id
+
+    def tearDown(self):
+        super(IdentityCacheTestCase, self).tearDown()
+        self.app.config['IDENTITY_CACHE_TTL'] = 0
+        app.auth._identities.clear()
+
+    def test_snapshot_leaves_out_the_password_hash(self):
+        load_identity(self.user_id)
+        snapshot = app.auth._identities[str(self.user_id)][1]
+        self.assertNotIn('password', snapshot)
+
+        db.session.remove()
+        user = load_identity(self.user_id)
+        self.assertEqual(user.email, 'staff@example.com')
+        # loaded from the database when it's needed
+        self.assertTrue(user.check_password(PASSWORD))
+
+    def test_password_reset_drops_the_cached_identity(self):
+        user = User.query.filter_by(email='reset@example.com').first()
+        user_id = user.id
+        client = self.client_for(user)
+        self.assertEqual(client.get('/assets/assigned_to_me').status_code,
+                         200)
+        self.assertIn(str(user_id), app.auth._identities)
+
+        guest = self.app.test_client()
+        guest.post('/password_reset', data={'email': 'reset@example.com'})
+        email = OutboxEmail.query.order_by(OutboxEmail.id.desc()).first()
+        link = re.search(r'(/password_reset/\S+)', email.body).group(1)
+        response = guest.post(link, data={'email': 'reset@example.com',
+                                          'password': 'changed',
+                                          'confirm': 'changed'})
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn(str(user_id), app.auth._identities)
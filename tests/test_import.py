@@ -0,0 +1,52 @@
+from StringIO import StringIO
+
+from app.assets.bulk import import_assets
+from app.models import Asset, AssetEvent, User
+
+from tests.base import AppTestCase
+
+
+class ImportTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        cls.add_user('admin@example.com', 'admin')
+
+    def import_file(self, content, file_format):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        return import_assets(StringIO(content), file_format, admin)
+
+    def test_bad_csv_rows_are_rejected_without_stopping_the_import(self):
+        result = self.import_file(
+            '\xef\xbb\xbfname,type,serial_no,code,purchased\r\n'
+            'Laptop,Computer,S1,CSV1,01/02/2016\r\n'
+            'Caf\xe9,Computer,S2,CSV2,\r\n'
+            'Null\x00,Computer,S3,CSV3,\r\n'
+            'Caf\xc3\xa9,Computer,S4,CSV4,2016-02-01\r\n',
+            'csv')
+        self.assertEqual(result.imported, 2)
+        self.assertEqual([number for number, _ in result.rejected], [2, 3])
+        self.assertEqual(Asset.query.filter_by(code='CSV4').first().name,
+                         u'Caf\xe9')
+
+    def test_ndjson_byte_order_mark_is_ignored(self):
+        result = self.import_file(
+            '\xef\xbb\xbf{"name": "Phone", "type": "Phone", '
+            '"serial_no": "S1", "code": "JSON1"}\n'
+            'not json\n',
+            'ndjson')
+        self.assertEqual(result.imported, 1)
+        self.assertEqual(result.rejected, [(2, "Not a valid record")])
+
+    def test_imported_assets_have_add_events(self):
+        result = self.import_file(
+            'name,type,serial_no,code\r\n'
+            'Mouse,Accessory,S1,EVENT1\r\n'
+            'Keyboard,Accessory,S2,EVENT2\r\n',
+            'csv')
+        self.assertEqual(result.imported, 2)
+        events = AssetEvent.query.join(Asset) \
+            .filter(Asset.code.in_(['EVENT1', 'EVENT2'])).all()
+        self.assertEqual(sorted((event.asset.code, event.kind,
+                                 event.actor.email) for event in events),
+                         [('EVENT1', 'add', 'admin@example.com'),
+                          ('EVENT2', 'add', 'admin@example.com')])
@@ -0,0 +1,53 @@
+import re
+
+from itsdangerous import URLSafeTimedSerializer
+
+from app import db
+from app.auth.invitations import invite_many
+from app.auth.tokens import load_invitation
+from app.models import OutboxEmail, Role, User
+
+from tests.base import AppTestCase, PASSWORD
+
+
+class InvitationTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        cls.add_user('admin@example.com', 'admin')
+        cls.add_user('Staff@Example.com')
+
+    def test_existing_users_are_matched_ignoring_case(self):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        results = invite_many(['staff@example.COM', 'new@example.com'],
+                              Role.get('staff'), admin)
+        self.assertEqual(results, [
+            ('staff@example.COM', "Email belongs to an existing user"),
+            ('new@example.com', None)])
+
+    def signup(self, token, email):
+        return self.app.test_client().post('/signup?invite=' + token, data={
+            'email': email, 'name': 'New', 'password': PASSWORD,
+            'confirm': PASSWORD})
+
+    def test_signup_takes_the_role_from_the_invitation_row(self):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        invite_many(['invited@example.com'], Role.get('staff'), admin)
+        db.session.commit()
+        email = OutboxEmail.query.filter(
+            OutboxEmail.recipients.contains('invited@example.com')).first()
+        token = re.search(r'invite=([\w.-]+)', email.body).group(1)
+
+        # the same invitation signed again with another role
+        invite = load_invitation(token)
+        forged = URLSafeTimedSerializer(
+            self.app.config['SECRET_KEY'], salt='invitation').dumps(
+                [invite.nonce, invite.invitee, Role.get('superadmin').id])
+        self.assertEqual(self.signup(forged, 'invited@example.com')
+                         .status_code, 200)
+        self.assertIsNone(
+            User.query.filter_by(email='invited@example.com').first())
+
+        self.assertEqual(self.signup(token, 'invited@example.com')
+                         .status_code, 302)
+        user = User.query.filter_by(email='invited@example.com').first()
+        self.assertEqual(user.role.short, 'staff')
@@ -0,0 +1,175 @@
+import asyncore
+import json
+import smtpd
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import OutboxEmail
+from app.outbox import deliver_due, purge_done, OUTBOX_KEEP, \
+    OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY
+
+from tests.base import AppTestCase
+
+
+class SMTPStandIn(smtpd.SMTPServer):
+    """Keeps what it's sent, and refuses mail for reject@example.com"""
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ('127.0.0.1', 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.received = []
+        self.running = True
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        while self.running:
+            asyncore.loop(timeout=0.05, count=1)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.close()
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        if 'reject@example.com' in rcpttos:
+            return '550 No such user'
+        self.received.append(rcpttos)
+
+
+def closed_port():
+    """A local port nothing is listening on"""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class OutboxDeliveryTestCase(AppTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(OutboxDeliveryTestCase, cls).setUpClass()
+        cls.smtp = SMTPStandIn()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.smtp.stop()
+        super(OutboxDeliveryTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        OutboxEmail.query.delete()
+        db.session.commit()
+        self.smtp.received = []
+        # the mail settings are read when the app is made
+        self.mail = self.app.extensions['mail']
+        self.saved = self.mail.server, self.mail.port, self.mail.suppress
+        self.mail.server, self.mail.port, self.mail.suppress = \
+            '127.0.0.1', self.smtp.port, False
+
+    def tearDown(self):
+        super(OutboxDeliveryTestCase, self).tearDown()
+        self.mail.server, self.mail.port, self.mail.suppress = self.saved
+
+    def queue(self, *recipients):
+        emails = [OutboxEmail('Hello', 'admin@example.com', [recipient],
+                              'Hello', None) for recipient in recipients]
+        db.session.add_all(emails)
+        db.session.commit()
+        return [email.id for email in emails]
+
+    def emails(self, ids):
+        db.session.expire_all()
+        return [OutboxEmail.query.get(email_id) for email_id in ids]
+
+    def assertRetryIn(self, email, delay):
+        expected = datetime.now() + timedelta(seconds=delay)
+        self.assertLess(abs((email.due - expected).total_seconds()), 5)
+
+    def test_due_emails_are_sent(self):
+        ids = self.queue('one@example.com', 'two@example.com')
+        self.assertEqual(deliver_due(), 2)
+        self.assertEqual(sorted(self.smtp.received),
+                         [['one@example.com'], ['two@example.com']])
+        for email in self.emails(ids):
+            self.assertIsNotNone(email.sent)
+            self.assertIsNone(email.due)
+            self.assertEqual(email.attempts, 1)
+        # nothing is left to send
+        self.assertEqual(deliver_due(), 0)
+
+    def test_a_rejected_email_does_not_stop_the_others(self):
+        ids = self.queue('reject@example.com', 'one@example.com')
+        self.assertEqual(deliver_due(), 2)
+        rejected, sent = self.emails(ids)
+        self.assertIsNotNone(sent.sent)
+        self.assertIsNone(rejected.sent)
+        self.assertEqual(rejected.attempts, 1)
+        self.assertIn('No such user', rejected.error)
+        self.assertRetryIn(rejected, OUTBOX_RETRY_DELAY)
+
+    def test_connection_failures_back_off_then_give_up(self):
+        self.mail.port = closed_port()
+        ids = self.queue('one@example.com', 'two@example.com')
+        for attempt in range(1, OUTBOX_MAX_ATTEMPTS + 1):
+            self.assertEqual(deliver_due(), 2)
+            for email in self.emails(ids):
+                self.assertEqual(email.attempts, attempt)
+                self.assertIsNone(email.sent)
+                self.assertTrue(email.error)
+                if attempt < OUTBOX_MAX_ATTEMPTS:
+                    self.assertRetryIn(
+                        email, OUTBOX_RETRY_DELAY * 2 ** (attempt - 1))
+                    # make it due again for the next attempt
+                    email.due = datetime.now()
+                else:
+                    self.assertIsNone(email.due)
+            db.session.commit()
+
+        # the sender hears about each address that was given up on
+        notices = OutboxEmail.query.filter(~OutboxEmail.id.in_(ids)).all()
+        self.assertEqual(sorted(json.loads(notice.recipients)
+                                for notice in notices),
+                         [['admin@example.com']] * 2)
+        self.assertEqual(sorted(notice.body.split(' to ')[1].split()[0]
+                                for notice in notices),
+                         ['one@example.com', 'two@example.com'])
+
+    def test_emails_from_the_app_are_given_up_on_quietly(self):
+        self.mail.port = closed_port()
+        for sender in (self.app.config['MAIL_DEFAULT_SENDER'], None):
+            email = OutboxEmail('Reminder', sender, ['one@example.com'],
+                                'Reminder', None)
+            email.attempts = OUTBOX_MAX_ATTEMPTS - 1
+            db.session.add(email)
+        db.session.commit()
+        self.assertEqual(deliver_due(), 2)
+        self.assertEqual(OutboxEmail.query.count(), 2)
+
+
+class OutboxPurgeTestCase(AppTestCase):
+    def add_email(self, subject, age, sent=False, given_up=False):
+        email = OutboxEmail(subject, 'admin@example.com',
+                            ['staff@example.com'], subject, None)
+        email.created = datetime.now() - timedelta(seconds=age)
+        if sent:
+            email.delivered()
+        elif given_up:
+            email.failed(IOError("refused"), 0, 1)
+        db.session.add(email)
+
+    def test_only_old_finished_emails_are_purged(self):
+        old = OUTBOX_KEEP + 60
+        self.add_email('old sent', old, sent=True)
+        self.add_email('old given up', old, given_up=True)
+        self.add_email('old pending', old)
+        self.add_email('new sent', 60, sent=True)
+        db.session.commit()
+
+        self.assertEqual(purge_done(batch_size=1), 2)
+        self.assertEqual(sorted(subject for subject, in
+                                db.session.query(OutboxEmail.subject)),
+                         ['new sent', 'old pending'])
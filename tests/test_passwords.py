@@ -0,0 +1,36 @@
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import User
+
+from tests.base import AppTestCase, PASSWORD
+
+
+class PasswordRehashTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        user = cls.add_user('legacy@example.com')
+        # what werkzeug made before the method was configurable
+        user.password = generate_password_hash(PASSWORD, 'pbkdf2:sha1:1000')
+        db.session.commit()
+
+    def stored_method(self):
+        db.session.expire_all()
+        return User.query.filter_by(email='legacy@example.com').first() \
+            .password.split('$', 1)[0]
+
+    def login(self, password):
+        return self.app.test_client().post('/login', data={
+            'email': 'legacy@example.com', 'password': password})
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        self.assertEqual(self.login('wrong').status_code, 200)
+        self.assertEqual(self.stored_method(), 'pbkdf2:sha1:1000')
+
+        self.assertEqual(self.login(PASSWORD).status_code, 302)
+        self.assertEqual(self.stored_method(),
+                         self.app.config['PASSWORD_HASH_METHOD'])
+        self.assertNotEqual(self.app.config['PASSWORD_HASH_METHOD'],
+                            'pbkdf2:sha1:1000')
+        # and the new hash still works
+        self.assertEqual(self.login(PASSWORD).status_code, 302)
@@ -0,0 +1,168 @@
+from app import db
+from app.auth.tokens import invitation_token, password_reset_token
+from app.models import Invitation, PasswordResetRequest, Role, User
+
+from tests.base import AppTestCase, PASSWORD
+
+# rows seeded, enough for the planner to prefer an index to reading a table
+USERS = 20000
+ASSETS = 50000
+
+# tables a filtered query must never read from end to end
+LARGE_TABLES = ('asset', 'asset_event', 'assignment_history', 'user',
+                'roles', 'invitation', 'password_reset_request')
+
+
+class QueryPlanTestCase(AppTestCase):
+    """
+    Check the plans of the statements the busiest views run against a
+    large inventory: the indexes they rely on are used, and no filtered
+    statement falls back to a sequential scan of a large table.
+    """
+
+    @classmethod
+    def seed(cls):
+        admin = cls.add_user('admin@example.com', 'admin')
+        staff = cls.add_user('staff@example.com')
+        params = {'admin': admin.id, 'staff': staff.id,
+                  'role': Role.get('staff').id, 'users': USERS,
+                  'assets': ASSETS}
+        for statement in (
+                "INSERT INTO \"user\" (email, name, password) "
+                "SELECT 'user' || n || '@example.com', 'User ' || n, 'x' "
+                "FROM generate_series(1, :users) n",
+                "INSERT INTO roles (user_id, role_id) "
+                "SELECT id, :role FROM \"user\" WHERE email LIKE 'user%%'",
+                # one asset in fifty is assigned, one in five hundred lost
+                "INSERT INTO asset (name, type, serial_no, code, purchased, "
+                "added_by_id, lost, assignee_id, version) "
+                "SELECT 'Asset ' || n, 'Laptop', 'S' || n, 'C' || n, now(), "
+                ":admin, n % 500 = 0, CASE WHEN n % 50 = 0 "
+                "THEN :staff + 1 + n % :users END, 0 "
+                "FROM generate_series(1, :assets) n",
+                "UPDATE asset SET assignee_id = :staff "
+                "WHERE id IN (SELECT id FROM asset ORDER BY id LIMIT 3)",
+                "INSERT INTO assignment_history (asset_id, user_id, "
+                "assigned_at) SELECT id, assignee_id, now() FROM asset "
+                "WHERE assignee_id IS NOT NULL",
+                "INSERT INTO asset_event (asset_id, actor_id, kind, ts) "
+                "SELECT id, :admin, 'add', now() - interval '1 day' "
+                "FROM asset",
+                "INSERT INTO asset_event (asset_id, user_id, actor_id, kind, "
+                "ts) SELECT id, assignee_id, :admin, 'assign', now() "
+                "FROM asset WHERE assignee_id IS NOT NULL",
+                "INSERT INTO invitation (token, invitee, role_id, sender_id, "
+                "accepted, created) SELECT 'i' || n, 'new' || n || "
+                "'@example.com', :role, :admin, false, now() "
+                "FROM generate_series(1, :users) n",
+                "INSERT INTO password_reset_request (token, user_id, time, "
+                "used) SELECT 'p' || id, id, now(), false FROM \"user\""):
+            db.session.execute(statement, params)
+        db.session.commit()
+        db.session.execute("ANALYZE")
+        db.session.commit()
+
+    def plans(self, statements):
+        """The EXPLAIN output of each statement that reads rows"""
+        cursor = db.session.connection().connection.cursor()
+        plans = []
+        for statement, parameters in statements:
+            if statement.lstrip().split(None, 1)[0].upper() not in (
+                    'SELECT', 'UPDATE', 'DELETE'):
+                continue
+            cursor.execute("EXPLAIN " + statement, parameters)
+            plans.append((statement, '\n'.join(row[0] for row in cursor)))
+        return plans
+
+    def assertPlansUse(self, statements, *indexes):
+        plans = self.plans(statements)
+        for statement, plan in plans:
+            if ' WHERE ' not in statement:
+                continue
+            for table in LARGE_TABLES:
+                self.assertNotIn('Seq Scan on %s ' % table, plan + ' ',
+                                 '%s\n%s' % (statement, plan))
+        everything = '\n'.join(plan for _, plan in plans)
+        for index in indexes:
+            self.assertIn(' %s ' % index, everything)
+
+    def get(self, user, url):
+        client = self.client_for(user)
+        with self.count_queries() as statements:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            # streamed responses only run their queries when read
+            response.data
+        return statements
+
+    def test_asset_lists(self):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        staff = User.query.filter_by(email='staff@example.com').first()
+        self.assertPlansUse(
+            self.get(staff, '/assets/assigned_to_me?accept=json'),
+            'ix_asset_assignee_id', 'ix_roles_user_id')
+        self.assertPlansUse(
+            self.get(admin, '/assets/admin/lost?accept=json'),
+            'ix_asset_lost')
+        for filter_by in ('', 'assigned', 'available'):
+            self.assertPlansUse(
+                self.get(admin, '/assets/admin/%s?accept=json' % filter_by))
+        self.assertPlansUse(
+            self.get(staff, '/assets/assigned_to_me?accept=json&since=0'),
+            'ix_asset_version')
+
+    def test_timelines(self):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        staff = User.query.filter_by(email='staff@example.com').first()
+        asset = staff.assets_assigned.first()
+        self.assertPlansUse(
+            self.get(admin, '/assets/%d/timeline' % asset.id),
+            'ix_asset_event_asset_id_ts')
+        self.assertPlansUse(
+            self.get(staff, '/assets/users/%d/timeline' % staff.id),
+            'ix_asset_event_user_id_ts')
+        self.assertPlansUse(
+            self.get(admin, '/assets/admin/as_of?date=2100-01-01&user_id=%d'
+                     % staff.id),
+            'ix_asset_event_user_id_ts', 'ix_asset_event_asset_id_ts')
+
+    def test_dashboard(self):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        self.assertPlansUse(self.get(admin, '/'), 'ix_asset_assignee_id')
+
+    def test_login(self):
+        client = self.app.test_client()
+        with self.count_queries() as statements:
+            response = client.post('/login', data={
+                'email': 'staff@example.com', 'password': PASSWORD})
+            self.assertEqual(response.status_code, 302)
+        self.assertPlansUse(statements, 'user_email_key')
+
+    def test_invitation_signup(self):
+        role_id = Role.get('staff').id
+        nonce, token = invitation_token('new@example.com', role_id)
+        db.session.execute(Invitation.__table__.insert(), {
+            'token': nonce, 'invitee': 'new@example.com', 'role_id': role_id,
+            'accepted': False})
+        db.session.commit()
+        client = self.app.test_client()
+        with self.count_queries() as statements:
+            response = client.post('/signup?invite=' + token, data={
+                'email': 'new@example.com', 'name': 'New',
+                'password': PASSWORD, 'confirm': PASSWORD})
+        self.assertEqual(response.status_code, 302)
+        self.assertPlansUse(statements, 'user_email_key',
+                            'invitation_token_key')
+
+    def test_password_reset(self):
+        user = User.query.filter_by(email='user1@example.com').first()
+        nonce, token = password_reset_token(user)
+        db.session.add(PasswordResetRequest(nonce, user))
+        db.session.commit()
+        client = self.app.test_client()
+        with self.count_queries() as statements:
+            response = client.post('/password_reset/' + token, data={
+                'email': user.email, 'password': 'changed',
+                'confirm': 'changed'})
+        self.assertEqual(response.status_code, 302)
+        self.assertPlansUse(statements, 'password_reset_request_token_key')
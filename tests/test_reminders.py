@@ -0,0 +1,51 @@
+import json
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Asset, OutboxEmail, User
+from app.reminders import send_reminders
+
+from tests.base import AppTestCase
+
+
+class ReminderTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        admin = cls.add_user('admin@example.com', 'admin')
+        staff = cls.add_user('staff@example.com')
+        now = datetime.now()
+        for code, due, lost in (('NEAR', now + timedelta(days=1), False),
+                                ('PAST', now - timedelta(days=1), False),
+                                ('LATER', now + timedelta(days=30), False),
+                                ('LOST', now - timedelta(days=1), True)):
+            asset = Asset(code, 'Laptop', '', code, code,
+                          datetime(2016, 1, 1), admin)
+            asset.assign(staff, due)
+            asset.lost = lost
+            db.session.add(asset)
+        db.session.commit()
+
+    def queued(self):
+        return dict((json.loads(email.recipients)[0], email.body)
+                    for email in OutboxEmail.query)
+
+    def test_due_assets_are_reminded_about_once(self):
+        self.assertEqual(send_reminders(), 2)
+        emails = self.queued()
+        self.assertEqual(sorted(emails),
+                         ['admin@example.com', 'staff@example.com'])
+        for body in emails.values():
+            self.assertIn('NEAR (NEAR) is due back on', body)
+            self.assertIn('PAST (PAST) was due back on', body)
+            self.assertNotIn('LATER', body)
+            self.assertNotIn('LOST', body)
+        self.assertIn('staff:', emails['admin@example.com'])
+
+        # already reminded about
+        self.assertEqual(send_reminders(), 0)
+        self.assertEqual(OutboxEmail.query.count(), 2)
+
+        # once the near one is overdue it's reminded about again
+        self.assertEqual(
+            send_reminders(datetime.now() + timedelta(days=2)), 1)
+        self.assertEqual(OutboxEmail.query.count(), 4)
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.auth.tokens import purge_expired
+from app.models import Invitation
+
+from tests.base import AppTestCase
+
+
+class PurgeExpiredTestCase(AppTestCase):
+    def test_only_used_and_expired_invitations_are_purged(self):
+        max_age = timedelta(seconds=self.app.config['INVITATION_MAX_AGE'])
+        now = datetime.now()
+        db.session.execute(Invitation.__table__.insert(), [
+            {'token': 'pending', 'accepted': False, 'created': now},
+            {'token': 'accepted', 'accepted': True, 'created': now},
+            {'token': 'expired', 'accepted': False,
+             'created': now - max_age - timedelta(minutes=1)},
+        ])
+        db.session.commit()
+
+        self.assertEqual(purge_expired(), 2)
+        self.assertEqual([token for token, in
+                          db.session.query(Invitation.token)], ['pending'])
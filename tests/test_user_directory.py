@@ -0,0 +1,85 @@
+import re
+from datetime import datetime, timedelta
+
+from app import db
+from app.account.views import USERS_PAGE_SIZE
+from app.models import Asset, User
+
+from tests.base import AppTestCase
+
+MEMBERS = USERS_PAGE_SIZE + 5
+
+
+class UserDirectoryTestCase(AppTestCase):
+    @classmethod
+    def seed(cls):
+        admin = cls.add_user('admin@example.com', 'admin', 'Admin')
+        holder = cls.add_user('zed@example.com', name='Holder Zed')
+        for number in range(MEMBERS):
+            cls.add_user('member%02d@example.com' % number,
+                         name='Member %02d' % number)
+        for number in range(3):
+            asset = Asset('Asset %d' % number, 'Laptop', '', 'S%d' % number,
+                          'C%d' % number, datetime(2016, 1, 1), admin)
+            db.session.add(asset)
+            if number < 2:
+                asset.assign(holder, datetime.now() + timedelta(days=30))
+        db.session.commit()
+
+    def names(self, rows):
+        return [user.name for user, _, _ in rows]
+
+    def test_text_search_matches_names_and_emails(self):
+        self.assertEqual(self.names(User.directory('holder')), ['Holder Zed'])
+        self.assertEqual(self.names(User.directory('zed@example')),
+                         ['Holder Zed'])
+        self.assertEqual(self.names(User.directory('member 03')),
+                         ['Member 03'])
+        self.assertEqual(User.directory('nobody'), [])
+
+    def test_role_filter(self):
+        rows = User.directory(role_short='admin')
+        self.assertEqual(self.names(rows), ['Admin'])
+        self.assertEqual(rows[0][1].short, 'admin')
+        rows = User.directory(role_short='staff', limit=100)
+        self.assertEqual(len(rows), MEMBERS + 1)
+        self.assertEqual(set(role.short for _, role, _ in rows), {'staff'})
+        self.assertEqual(User.directory('holder', 'admin'), [])
+
+    def test_rows_count_the_assets_held(self):
+        held = dict((user.name, count) for user, _, count in
+                    User.directory(limit=100))
+        self.assertEqual(held['Holder Zed'], 2)
+        self.assertEqual(held['Admin'], 0)
+        self.assertEqual(held['Member 00'], 0)
+
+        admin = User.query.filter_by(email='admin@example.com').first()
+        response = self.client_for(admin).get('/users/?q=holder')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('2 assets held', response.data)
+
+    def listed(self, response):
+        self.assertEqual(response.status_code, 200)
+        return re.findall(r'<a href="/users/\d+">([^<]+)</a>', response.data)
+
+    def test_pages_past_the_page_size(self):
+        admin = User.query.filter_by(email='admin@example.com').first()
+        client = self.client_for(admin)
+        everyone = ['Admin', 'Holder Zed'] + ['Member %02d' % number
+                                              for number in range(MEMBERS)]
+
+        response = client.get('/users/')
+        self.assertEqual(self.listed(response), everyone[:USERS_PAGE_SIZE])
+        self.assertIn('href="/users/?page=2">Next', response.data)
+        self.assertNotIn('Previous', response.data)
+
+        response = client.get('/users/?page=2')
+        self.assertEqual(self.listed(response), everyone[USERS_PAGE_SIZE:])
+        self.assertIn('href="/users/?page=1">Previous', response.data)
+        self.assertNotIn('Next', response.data)
+
+        response = client.get('/users/?q=member&role=staff&page=2')
+        self.assertEqual(self.listed(response),
+                         everyone[USERS_PAGE_SIZE + 2:])
+        self.assertIn('Previous', response.data)
+        self.assertIn('q=member', response.data)